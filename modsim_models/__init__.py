@@ -0,0 +1,8 @@
+"""Bike share and world population models from Modeling and Simulation
+in Python, as importable modules.
+
+The modules are imported on demand, for example:
+
+    from modsim_models import bikeshare
+    from modsim_models.growth import run_simulation
+"""
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks for the simulation and data-loading hot paths.
+
+Run all benchmarks and append the results to the history file:
+
+    python -m modsim_models.benchmarks
+
+Save the current results as the baseline, then compare later runs
+against it; benchmarks that got slower by more than the tolerance are
+reported as regressions and the script exits with status 1:
+
+    python -m modsim_models.benchmarks --save-baseline
+    python -m modsim_models.benchmarks --tolerance 0.2
+
+Use `--quick` to skip the largest sizes.
+"""
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+from os.path import exists
+
+HISTORY = 'bench_history.jsonl'
+BASELINE = 'bench_baseline.json'
+
+BIKESHARE_STEPS = [10**3, 10**4, 10**5, 10**6, 10**7]
+GROWTH_YEARS = [10**2, 10**3, 10**4, 10**5]
+NUM_PARAMETER_SETS = 1000
+ERROR_SIZES = [10**3, 10**5, 10**6]
+
+
+def time_it(func, repeat=3):
+    """Time a function, keeping the best of several runs.
+
+    func: function with no arguments
+    repeat: number of runs
+
+    returns: elapsed time in seconds
+    """
+    best = float('inf')
+    for i in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_bikeshare(max_steps):
+    """Time the bikeshare run_simulation at increasing numbers of steps."""
+    from .bikeshare import make_state, run_simulation
+
+    results = {}
+    for num_steps in BIKESHARE_STEPS:
+        if num_steps > max_steps:
+            break
+        repeat = 3 if num_steps <= 10**5 else 1
+
+        def run():
+            run_simulation(make_state(), 0.3, 0.2, num_steps)
+
+        results['bikeshare.run_simulation[%d]' % num_steps] = \
+            time_it(run, repeat)
+    return results
+
+
+def bench_growth(max_years):
+    """Time the growth models over long horizons and many parameter sets."""
+    from .growth import (growth_func1, growth_func2, growth_func3,
+                         run_simulation, run_simulation1, run_simulation2)
+    from .params import Params
+
+    def make_system(years, alpha=0.0173):
+        return Params(t_0=1950, t_end=1950 + years, p_0=2.557,
+                      annual_growth=0.07, birth_rate=0.025,
+                      death_rate=0.0077, alpha=alpha,
+                      alpha1=0.019, alpha2=0.015)
+
+    simulations = [
+        ('run_simulation1', run_simulation1),
+        ('run_simulation2', run_simulation2),
+        ('run_simulation(growth_func1)',
+         lambda system: run_simulation(system, growth_func1)),
+        ('run_simulation(growth_func2)',
+         lambda system: run_simulation(system, growth_func2)),
+        ('run_simulation(growth_func3)',
+         lambda system: run_simulation(system, growth_func3)),
+    ]
+
+    results = {}
+    for years in GROWTH_YEARS:
+        if years > max_years:
+            break
+        system = make_system(years)
+        for name, simulate in simulations:
+            key = 'growth.%s[%d]' % (name, years)
+            results[key] = time_it(lambda: simulate(system))
+
+    systems = [make_system(66, alpha=0.01 + i * 1e-5)
+               for i in range(NUM_PARAMETER_SETS)]
+
+    def sweep():
+        for system in systems:
+            run_simulation(system, growth_func2)
+
+    key = 'growth.sweep(growth_func2)[%d]' % NUM_PARAMETER_SETS
+    results[key] = time_it(sweep)
+    return results
+
+
+def bench_population(filename, max_size):
+    """Time reading the estimates table and computing the errors."""
+    import numpy as np
+    import pandas as pd
+    from .population import compute_errors, load_estimates
+
+    results = {}
+    if exists(filename):
+        results['population.read_html'] = \
+            time_it(lambda: load_estimates(filename))
+        census, un = load_estimates(filename)
+        results['population.compute_errors[table]'] = \
+            time_it(lambda: compute_errors(un, census))
+    else:
+        print('Skipping read_html: %s not found' % filename)
+
+    rng = np.random.default_rng(17)
+    for size in ERROR_SIZES:
+        if size > max_size:
+            break
+        census = pd.Series(rng.uniform(2, 8, size))
+        un = census + rng.normal(0, 0.01, size)
+        un.iloc[-1] = np.nan
+        key = 'population.compute_errors[%d]' % size
+        results[key] = time_it(lambda: compute_errors(un, census))
+    return results
+
+
+def git_commit():
+    """Get the hash of the current commit, or None."""
+    try:
+        output = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                                capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.stdout.strip()
+
+
+def find_regressions(results, baseline, tolerance):
+    """Compare results with a baseline.
+
+    results: map from benchmark name to seconds
+    baseline: map from benchmark name to seconds
+    tolerance: allowed fractional slowdown
+
+    returns: list of (name, baseline seconds, current seconds)
+    """
+    regressions = []
+    for name, elapsed in sorted(results.items()):
+        before = baseline.get(name)
+        if before is not None and elapsed > before * (1 + tolerance):
+            regressions.append((name, before, elapsed))
+    return regressions
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--quick', action='store_true',
+                        help='skip the largest sizes')
+    parser.add_argument('--only', choices=['bikeshare', 'growth',
+                                           'population'],
+                        action='append', help='run only these groups')
+    parser.add_argument('--data', default='World_population_estimates.html',
+                        help='path of the population estimates page')
+    parser.add_argument('--history', default=HISTORY)
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed fractional slowdown (default 0.2)')
+    options = parser.parse_args(args)
+
+    groups = options.only or ['bikeshare', 'growth', 'population']
+    results = {}
+    if 'bikeshare' in groups:
+        results.update(bench_bikeshare(10**5 if options.quick else 10**7))
+    if 'growth' in groups:
+        results.update(bench_growth(10**3 if options.quick else 10**5))
+    if 'population' in groups:
+        max_size = 10**5 if options.quick else 10**6
+        results.update(bench_population(options.data, max_size))
+
+    for name, elapsed in sorted(results.items()):
+        print('%-50s %12.6f s' % (name, elapsed))
+
+    record = dict(time=time.strftime('%Y-%m-%dT%H:%M:%S'),
+                  commit=git_commit(),
+                  python=platform.python_version(),
+                  machine=platform.machine(),
+                  results=results)
+    with open(options.history, 'a') as f:
+        f.write(json.dumps(record) + '\n')
+
+    if options.save_baseline:
+        with open(options.baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print('Saved baseline to', options.baseline)
+        return 0
+
+    if not exists(options.baseline):
+        return 0
+
+    with open(options.baseline) as f:
+        baseline = json.load(f)
+    regressions = find_regressions(results, baseline, options.tolerance)
+    for name, before, after in regressions:
+        print('REGRESSION %s: %.6f s -> %.6f s (%+.0f%%)' %
+              (name, before, after, 100 * (after / before - 1)))
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""Bike share model for Olin and Wellesley.
+
+Importable versions of the functions developed in richard_gbamara3.py.
+Unlike the notebook version, `run_simulation` returns the results
+instead of plotting them; use `plot_results` to draw them.
+
+The module is built on core.py, so importing it does not import pandas
+or modsim; random numbers come from the standard `random` module.
+"""
+
+from contextlib import nullcontext
+from time import perf_counter_ns
+
+from . import core
+from . import profiling
+from .core import State, TimeSeries, bikeshare_kernel, flip
+
+
+def make_state(olin=10, wellesley=2):
+    """Make a bikeshare State with the unhappy-customer counters at zero.
+
+    olin: number of bikes at Olin
+    wellesley: number of bikes at Wellesley
+
+    returns: State object
+    """
+    return State(olin=olin, wellesley=wellesley,
+                 olin_empty=0, wellesley_empty=0)
+
+
+def bike_to_olin(state):
+    """Move one bike from Wellesley to Olin.
+
+    state: bikeshare State object
+    """
+    if state.wellesley == 0:
+        state.wellesley_empty += 1
+        return
+    state.wellesley -= 1
+    state.olin += 1
+
+
+def bike_to_wellesley(state):
+    """Move one bike from Olin to Wellesley.
+
+    state: bikeshare State object
+    """
+    if state.olin == 0:
+        state.olin_empty += 1
+        return
+    state.olin -= 1
+    state.wellesley += 1
+
+
+def step(state, p1, p2):
+    """Simulate one time step.
+
+    state: bikeshare State object
+    p1: probability of an Olin->Wellesley ride
+    p2: probability of a Wellesley->Olin ride
+    """
+    profiler = profiling.current
+    if profiler is not None:
+        return step_profiled(state, p1, p2, profiler)
+
+    if flip(p1):
+        bike_to_wellesley(state)
+
+    if flip(p2):
+        bike_to_olin(state)
+
+
+def step_profiled(state, p1, p2, profiler, rand=None):
+    """Simulate one time step, timing each phase.
+
+    state: bikeshare State object
+    p1: probability of an Olin->Wellesley ride
+    p2: probability of a Wellesley->Olin ride
+    profiler: Profiler object
+    rand: function that returns uniform numbers, or None to use flip
+    """
+    add_time = profiler.add_time
+
+    start = perf_counter_ns()
+    ride1 = flip(p1) if rand is None else rand() < p1
+    add_time('flip', perf_counter_ns() - start)
+    if ride1:
+        start = perf_counter_ns()
+        bike_to_wellesley(state)
+        add_time('bike_to_wellesley', perf_counter_ns() - start)
+
+    start = perf_counter_ns()
+    ride2 = flip(p2) if rand is None else rand() < p2
+    add_time('flip', perf_counter_ns() - start)
+    if ride2:
+        start = perf_counter_ns()
+        bike_to_olin(state)
+        add_time('bike_to_olin', perf_counter_ns() - start)
+
+    profiler.count('steps')
+
+
+def run_simulation(state, p1, p2, num_steps, rand=None):
+    """Simulate the given number of time steps.
+
+    state: State object
+    p1: probability of an Olin->Wellesley customer arrival
+    p2: probability of a Wellesley->Olin customer arrival
+    num_steps: number of time steps
+    rand: function that returns uniform numbers, to control the draws;
+          see variance.py
+
+    returns: TimeSeries of the number of bikes at Olin
+    """
+    profiler = profiling.current
+    if profiler is not None:
+        return run_simulation_profiled(state, p1, p2, num_steps, profiler,
+                                       rand)
+
+    values, final = bikeshare_kernel(state.olin, state.wellesley,
+                                     state.olin_empty, state.wellesley_empty,
+                                     p1, p2, num_steps, rand)
+    olin, wellesley, olin_empty, wellesley_empty = final
+    state.olin, state.wellesley = olin, wellesley
+    state.olin_empty, state.wellesley_empty = olin_empty, wellesley_empty
+
+    return TimeSeries(values)
+
+
+def run_simulation_profiled(state, p1, p2, num_steps, profiler, rand=None):
+    """Simulate the given number of time steps with instrumentation.
+
+    Same as `run_simulation`, but records phase timers, counters and
+    the latency of one step in every `profiler.sample_every`.
+
+    profiler: Profiler object
+
+    returns: TimeSeries of the number of bikes at Olin
+    """
+    add_time = profiler.add_time
+    histogram = profiler.histogram('bikeshare.step')
+    sample_every = profiler.sample_every
+    olin_empty, wellesley_empty = state.olin_empty, state.wellesley_empty
+
+    with profiler.phase('bikeshare.run_simulation'):
+        values = [state.olin]
+        for i in range(num_steps):
+            start = perf_counter_ns()
+            step_profiled(state, p1, p2, profiler, rand)
+            if i % sample_every == 0:
+                histogram.add(perf_counter_ns() - start)
+
+            start = perf_counter_ns()
+            values.append(state.olin)
+            add_time('record', perf_counter_ns() - start)
+
+        with profiler.phase('record'):
+            results = TimeSeries(values)
+
+    # count this run's unhappy customers, not the State's running totals
+    profiler.count('olin_empty', state.olin_empty - olin_empty)
+    profiler.count('wellesley_empty',
+                   state.wellesley_empty - wellesley_empty)
+    return results
+
+
+def plot_results(results):
+    """Plot the number of bikes at Olin.
+
+    Long results are downsampled before drawing; see plotting.py.
+
+    results: TimeSeries returned by run_simulation
+    """
+    from .plotting import plot_series
+
+    profiler = profiling.current
+    timer = profiler.phase('plot') if profiler else nullcontext()
+
+    with timer:
+        plot_series(results, label='Olin')
+        core.decorate(title='Olin-Wellesley Bikeshare',
+                      xlabel='Time step (min)',
+                      ylabel='Number of bikes')
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""Find the best years for the growth rate to change.
+
+`growth_func3` switches from `alpha1` to `alpha2` in 1980, "an
+arbitrary choice". `fit_breakpoints` tries every candidate year, or
+every combination of `k` years, and returns the ones that fit the data
+best, with the growth rate of each segment.
+
+Rather than calling `run_simulation` once per candidate, it works with
+the annual log growth ratios of the data, log(p[t+1] / p[t]). In a
+proportional growth model, each ratio is log(1 + alpha) for the
+segment that contains year t, so the best alpha for a segment is
+determined by the mean of its ratios, and the squared error of a
+segment can be computed in constant time from prefix sums. With one
+break the search is linear in the number of years; with k breaks,
+dynamic programming takes O(k n^2) time.
+
+    fit = fit_breakpoints(census, k=1)
+    system = System(t_0=t_0, t_end=t_end, p_0=p_0,
+                    breaks=fit.breaks, alphas=fit.alphas)
+    results = run_simulation(system, growth_func_piecewise)
+"""
+
+from bisect import bisect_right
+from collections import namedtuple
+
+import numpy as np
+
+from .growth import run_simulation
+from .params import Params
+
+BreakpointFit = namedtuple('BreakpointFit',
+                           ['breaks', 'alphas', 'sse', 'mean_abs_error'])
+
+
+def growth_func_piecewise(t, pop, system):
+    """Compute growth with rates that change in the years in `breaks`.
+
+    With breaks=[1980] and alphas=[alpha1, alpha2], this is the same
+    as growth_func3.
+
+    t: current year
+    pop: current population
+    system: System object with `breaks` (sorted years) and `alphas`
+            (one more rate than breaks)
+
+    returns: net growth
+    """
+    return system.alphas[bisect_right(system.breaks, t)] * pop
+
+
+def bind_growth_func_piecewise(system):
+    """Make growth_func_piecewise with the parameters read into locals."""
+    breaks, alphas = list(system.breaks), list(system.alphas)
+
+    def growth(t, pop):
+        return alphas[bisect_right(breaks, t)] * pop
+
+    return growth
+
+
+growth_func_piecewise.bind = bind_growth_func_piecewise
+
+
+def log_ratios(series):
+    """Compute the annual log growth ratios of a series.
+
+    series: Series of positive values indexed by consecutive years
+
+    returns: years, ratios, valid (boolean array, False where either
+             value is missing)
+    """
+    values = np.asarray(series.values, dtype=float)
+    years = np.asarray(series.index[:-1])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ratios = np.log(values[1:] / values[:-1])
+    valid = np.isfinite(ratios)
+    return years, np.where(valid, ratios, 0), valid
+
+
+def segment_costs(ratios, valid):
+    """Make a function that computes the squared error of a segment.
+
+    ratios: array of log ratios, zero where invalid
+    valid: boolean array
+
+    returns: cost(i, j) for the segment of ratios i to j-1, and the
+             mean(i, j) of the same segment; both accept arrays
+    """
+    s1 = np.concatenate([[0], np.cumsum(ratios)])
+    s2 = np.concatenate([[0], np.cumsum(ratios**2)])
+    count = np.concatenate([[0], np.cumsum(valid)])
+
+    def mean(i, j):
+        n = count[j] - count[i]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(n > 0, (s1[j] - s1[i]) / n, 0)
+
+    def cost(i, j):
+        n = count[j] - count[i]
+        total = s1[j] - s1[i]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(n > 0,
+                            s2[j] - s2[i] - total**2 / np.maximum(n, 1), 0)
+
+    return cost, mean
+
+
+def best_single_break(cost, n, min_segment):
+    """Try every position for one break.
+
+    returns: position of the break, total cost
+    """
+    candidates = np.arange(min_segment, n - min_segment + 1)
+    if len(candidates) == 0:
+        raise ValueError('Series is too short for min_segment=%d' %
+                         min_segment)
+    total = cost(0, candidates) + cost(candidates, n)
+    best = int(np.argmin(total))
+    return [int(candidates[best])], float(total[best])
+
+
+def best_k_breaks(cost, n, k, min_segment):
+    """Find k breaks by dynamic programming over segment costs.
+
+    returns: list of break positions, total cost
+    """
+    i, j = np.meshgrid(np.arange(n + 1), np.arange(n + 1), indexing='ij')
+    costs = np.where(j - i >= min_segment, cost(i, j), np.inf)
+
+    # best[j] is the lowest cost of splitting ratios 0..j-1 into m+1
+    # segments; choice[m][j] is where the last of them starts
+    best = costs[0].copy()
+    choices = []
+    for m in range(k):
+        totals = best[:, None] + costs
+        choice = np.argmin(totals, axis=0)
+        best = totals[choice, np.arange(n + 1)]
+        choices.append(choice)
+
+    if not np.isfinite(best[n]):
+        raise ValueError('Series is too short for %d breaks with '
+                         'min_segment=%d' % (k, min_segment))
+
+    breaks = []
+    j = n
+    for choice in reversed(choices):
+        j = int(choice[j])
+        breaks.append(j)
+    return breaks[::-1], float(best[n])
+
+
+def fit_breakpoints(series, k=1, min_segment=5):
+    """Find the break years that best fit a proportional growth model.
+
+    series: Series of population estimates indexed by consecutive years,
+            such as `census` or `un`; missing values are skipped
+    k: number of breaks
+    min_segment: minimum number of years between breaks
+
+    returns: BreakpointFit with the break years, the alpha for each
+             segment, the squared error of the log ratios, and the mean
+             absolute error of the simulated trajectory
+    """
+    years, ratios, valid = log_ratios(series)
+    n = len(ratios)
+    cost, mean = segment_costs(ratios, valid)
+
+    if k == 0:
+        positions, sse = [], float(cost(0, n))
+    elif k == 1:
+        positions, sse = best_single_break(cost, n, min_segment)
+    else:
+        positions, sse = best_k_breaks(cost, n, k, min_segment)
+
+    edges = [0] + positions + [n]
+    alphas = [float(np.expm1(mean(i, j))) for i, j in zip(edges, edges[1:])]
+    breaks = [int(years[i]) for i in positions]
+
+    t_0, t_end = int(series.index[0]), int(series.index[-1])
+    system = Params(t_0=t_0, t_end=t_end, p_0=float(series.iloc[0]),
+                    breaks=tuple(breaks), alphas=tuple(alphas))
+    results = run_simulation(system, growth_func_piecewise)
+    abs_error = np.abs(results.values - series.values)
+    mean_abs_error = float(np.nanmean(abs_error))
+
+    return BreakpointFit(breaks, alphas, sse, mean_abs_error)
@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+"""Run batches of simulation scenarios in parallel.
+
+A scenario file is a JSON list, or JSON lines, of scenarios like:
+
+    {"name": "base", "model": "bikeshare",
+     "params": {"olin": 10, "wellesley": 2, "p1": 0.3, "p2": 0.2},
+     "replicas": 100, "horizon": 60, "seed": 1}
+
+    {"name": "alpha", "model": "growth2",
+     "params": {"t_0": 1950, "p_0": 2.557, "alpha": 0.0173},
+     "horizon": 66}
+
+Models are listed in MODELS. For the growth models, `horizon` is the
+number of years after `t_0`; for bikeshare, it is the number of steps.
+
+Each replica runs in a worker process, and each result is written to
+the output file as soon as it arrives, so results are never all held
+in memory. Parquet output requires pyarrow; CSV output does not.
+
+    python -m modsim_models.cli scenarios.jsonl results.parquet --workers 8
+"""
+
+import argparse
+import csv
+import json
+import os
+import random
+import sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from .core import bikeshare_kernel, growth_kernel
+
+
+def run_bikeshare(params, horizon):
+    """Run one bikeshare replica.
+
+    params: dict with olin, wellesley, p1 and p2
+    horizon: number of steps
+
+    returns: dict with t_0, values and the unhappy-customer counts
+    """
+    values, final = bikeshare_kernel(params.get('olin', 10),
+                                     params.get('wellesley', 2),
+                                     0, 0,
+                                     params['p1'], params['p2'], horizon)
+    olin, wellesley, olin_empty, wellesley_empty = final
+    return dict(t_0=0, values=values,
+                olin_empty=olin_empty, wellesley_empty=wellesley_empty)
+
+
+def growth_runner(name):
+    """Make a runner for one of the growth models in growth.py.
+
+    name: name of a growth function or simulation in growth.py
+
+    returns: function that takes (params, horizon) and returns a dict
+    """
+    def run(params, horizon):
+        from . import growth
+        from .params import Params
+
+        t_0 = params.get('t_0', 1950)
+        system = Params(**dict(params, t_0=t_0, t_end=t_0 + horizon))
+        if name.startswith('growth_func'):
+            growth_func = getattr(growth, name)
+            update = growth.bind_growth_func(growth_func, system)
+            values = growth_kernel(t_0, t_0 + horizon, system.p_0, update)
+        else:
+            values = list(getattr(growth, name)(system))
+        return dict(t_0=t_0, values=values,
+                    olin_empty=None, wellesley_empty=None)
+    return run
+
+
+MODELS = {
+    'bikeshare': run_bikeshare,
+    'constant': growth_runner('run_simulation1'),
+    'proportional': growth_runner('run_simulation2'),
+    'growth1': growth_runner('growth_func1'),
+    'growth2': growth_runner('growth_func2'),
+    'growth3': growth_runner('growth_func3'),
+}
+
+
+def run_task(scenario, replica):
+    """Run one replica of a scenario; this is what the workers call.
+
+    scenario: dict read from the scenario file
+    replica: replica index
+
+    returns: dict describing the result
+    """
+    random.seed('%s-%d' % (scenario.get('seed', 0), replica))
+    run = MODELS[scenario['model']]
+    result = run(scenario.get('params', {}), scenario['horizon'])
+    result.update(scenario=scenario['name'],
+                  model=scenario['model'],
+                  replica=replica)
+    return result
+
+
+def read_scenarios(filename):
+    """Read scenarios from a JSON or JSON lines file.
+
+    filename: path of the file
+
+    returns: list of dicts
+    """
+    with open(filename) as f:
+        text = f.read()
+    if text.lstrip().startswith('['):
+        scenarios = json.loads(text)
+    else:
+        scenarios = [json.loads(line) for line in text.splitlines()
+                     if line.strip()]
+
+    for i, scenario in enumerate(scenarios):
+        scenario.setdefault('name', 'scenario%d' % i)
+        if scenario.get('model') not in MODELS:
+            raise ValueError('Unknown model %r in scenario %r; '
+                             'expected one of %s' %
+                             (scenario.get('model'), scenario['name'],
+                              ', '.join(sorted(MODELS))))
+        if 'horizon' not in scenario:
+            raise ValueError('Scenario %r has no horizon' % scenario['name'])
+    return scenarios
+
+
+class ParquetWriter:
+    """Write results to a Parquet file, one row per replica.
+
+    filename: path of the output file
+    flush_every: number of results per row group
+    """
+
+    def __init__(self, filename, flush_every=64):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError('Parquet output requires pyarrow; install it '
+                              'or use --format csv')
+        self.pa = pa
+        self.schema = pa.schema([('scenario', pa.string()),
+                                 ('model', pa.string()),
+                                 ('replica', pa.int64()),
+                                 ('t_0', pa.int64()),
+                                 ('olin_empty', pa.int64()),
+                                 ('wellesley_empty', pa.int64()),
+                                 ('values', pa.list_(pa.float64()))])
+        self.writer = pq.ParquetWriter(filename, self.schema)
+        self.flush_every = flush_every
+        self.rows = []
+
+    def write(self, result):
+        """Add a result, writing a row group when enough have arrived."""
+        self.rows.append(result)
+        if len(self.rows) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered results as a row group."""
+        if self.rows:
+            table = self.pa.Table.from_pylist(self.rows, schema=self.schema)
+            self.writer.write_table(table)
+            self.rows = []
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+
+class CSVWriter:
+    """Write results to a CSV file, one row per time step.
+
+    filename: path of the output file
+    """
+
+    fields = ['scenario', 'model', 'replica', 'time', 'value',
+              'olin_empty', 'wellesley_empty']
+
+    def __init__(self, filename):
+        self.file = open(filename, 'w', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(self.fields)
+
+    def write(self, result):
+        """Write one row per time step of a result."""
+        t_0 = result['t_0']
+        for i, value in enumerate(result['values']):
+            self.writer.writerow([result['scenario'], result['model'],
+                                  result['replica'], t_0 + i, value,
+                                  result['olin_empty'],
+                                  result['wellesley_empty']])
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def tasks(scenarios):
+    """Generate (scenario, replica) pairs."""
+    for scenario in scenarios:
+        for replica in range(scenario.get('replicas', 1)):
+            yield scenario, replica
+
+
+def run_batch(scenarios, writer, workers=None, max_pending=None):
+    """Run scenarios in parallel, writing each result as it finishes.
+
+    scenarios: list of scenario dicts
+    writer: object with a write(result) method
+    workers: number of worker processes, default is the number of CPUs
+    max_pending: maximum number of submitted tasks that have not been
+                 written yet; bounds memory use
+
+    returns: number of results written
+    """
+    workers = workers or os.cpu_count() or 1
+    if max_pending is None:
+        max_pending = 4 * workers
+
+    count = 0
+    with ProcessPoolExecutor(workers) as executor:
+        pending = set()
+        for scenario, replica in tasks(scenarios):
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    writer.write(future.result())
+                    count += 1
+            pending.add(executor.submit(run_task, scenario, replica))
+
+        for future in wait(pending).done:
+            writer.write(future.result())
+            count += 1
+    return count
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description='Run simulation scenarios in parallel.')
+    parser.add_argument('scenarios', help='JSON or JSON lines scenario file')
+    parser.add_argument('output', help='output file')
+    parser.add_argument('--format', choices=['parquet', 'csv'],
+                        help='output format, by default from the extension')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of worker processes')
+    options = parser.parse_args(args)
+
+    scenarios = read_scenarios(options.scenarios)
+    output_format = options.format
+    if output_format is None:
+        output_format = 'csv' if options.output.endswith('.csv') else 'parquet'
+
+    if output_format == 'csv':
+        writer = CSVWriter(options.output)
+    else:
+        writer = ParquetWriter(options.output)
+
+    try:
+        count = run_batch(scenarios, writer, options.workers)
+    finally:
+        writer.close()
+    print('Wrote %d results to %s' % (count, options.output))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""Slim core of the bikeshare and growth models.
+
+This module imports only the standard library, so importing it (or a
+model module built on it) takes milliseconds, even in a fresh worker
+process. pandas, NumPy and matplotlib are loaded the first time one
+of their attributes is used:
+
+    from modsim_models import core
+    core.np          # imports numpy now
+    core.plt         # imports matplotlib.pyplot now
+
+`State`, `TimeSeries`, `flip` and `decorate` work like their modsim
+counterparts, without requiring modsim:
+`State` is a lightweight namespace rather than a pandas Series,
+`TimeSeries` imports pandas only when a series is created, and `flip`
+uses the standard `random` module, so seed it with `random.seed`.
+"""
+
+import random
+from importlib import import_module
+from types import SimpleNamespace
+
+# map from attribute name to (module name, attribute in module or None)
+LAZY_ATTRIBUTES = {
+    'np': ('numpy', None),
+    'pd': ('pandas', None),
+    'plt': ('matplotlib.pyplot', None),
+}
+
+
+def load(name):
+    """Import a lazy attribute and cache it in this module.
+
+    name: key in LAZY_ATTRIBUTES
+
+    returns: module or object
+    """
+    module_name, attr = LAZY_ATTRIBUTES[name]
+    value = import_module(module_name)
+    if attr is not None:
+        value = getattr(value, attr)
+    globals()[name] = value
+    return value
+
+
+def __getattr__(name):
+    if name in LAZY_ATTRIBUTES:
+        return load(name)
+    raise AttributeError('module %r has no attribute %r' % (__name__, name))
+
+
+def flip(p=0.5):
+    """Flip a coin with the given probability of heads.
+
+    p: probability of heads
+
+    returns: boolean
+    """
+    return random.random() < p
+
+
+def decorate(**options):
+    """Decorate the current axes, like modsim.decorate.
+
+    Passes the options, such as title, xlabel and ylabel, to
+    `Axes.set`, adds a legend if there are labeled lines, and tightens
+    the layout. Imports matplotlib.pyplot the first time it is called.
+
+    options: keyword arguments passed to Axes.set
+    """
+    plt = globals().get('plt') or load('plt')
+    ax = plt.gca()
+    ax.set(**options)
+
+    handles, labels = ax.get_legend_handles_labels()
+    if handles:
+        ax.legend(handles, labels)
+
+    plt.tight_layout()
+
+
+class State(SimpleNamespace):
+    """Mutable collection of state variables."""
+
+    def items(self):
+        return vars(self).items()
+
+
+def TimeSeries(*args, **kwargs):
+    """Make a pandas Series to represent a time series.
+
+    returns: Series with the index named 'Time'
+    """
+    pd = globals().get('pd') or load('pd')
+    if args or kwargs:
+        series = pd.Series(*args, **kwargs)
+    else:
+        series = pd.Series([], dtype=float)
+    series.index.name = 'Time'
+    if 'name' not in kwargs:
+        series.name = 'Quantity'
+    return series
+
+
+def bikeshare_kernel(olin, wellesley, olin_empty, wellesley_empty,
+                     p1, p2, num_steps, rand=None):
+    """Simulate the bikeshare model with plain integers.
+
+    Same semantics as calling `step` from bikeshare.py `num_steps`
+    times, without the attribute lookups.
+
+    Each step draws exactly two uniform numbers, first for the
+    Olin->Wellesley ride and then for the Wellesley->Olin ride, so
+    runs that share a source of draws stay synchronized.
+
+    olin, wellesley: number of bikes at each station
+    olin_empty, wellesley_empty: unhappy-customer counters
+    p1: probability of an Olin->Wellesley ride
+    p2: probability of a Wellesley->Olin ride
+    num_steps: number of time steps
+    rand: function that returns uniform numbers in [0, 1),
+          default is random.random
+
+    returns: list of the number of bikes at Olin after each step,
+             and the final (olin, wellesley, olin_empty, wellesley_empty)
+    """
+    if rand is None:
+        rand = random.random
+    values = [olin]
+    append = values.append
+
+    for i in range(num_steps):
+        if rand() < p1:
+            if olin == 0:
+                olin_empty += 1
+            else:
+                olin -= 1
+                wellesley += 1
+        if rand() < p2:
+            if wellesley == 0:
+                wellesley_empty += 1
+            else:
+                wellesley -= 1
+                olin += 1
+        append(olin)
+
+    return values, (olin, wellesley, olin_empty, wellesley_empty)
+
+
+def growth_kernel(t_0, t_end, p_0, growth):
+    """Simulate a growth model with a bound growth function.
+
+    t_0, t_end: first and last year
+    p_0: population in year t_0
+    growth: function that takes (t, pop) and returns net growth
+
+    returns: list of populations from t_0 to t_end
+    """
+    pop = p_0
+    values = [pop]
+    append = values.append
+    for t in range(t_0, t_end):
+        pop = pop + growth(t, pop)
+        append(pop)
+    return values
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""Ensemble projections of world population.
+
+`run_ensemble` samples growth parameters (for example `alpha`, or
+`birth_rate` and `death_rate`) from distributions, runs many
+trajectories of a growth model, and summarizes them as per-year
+quantile bands.
+
+Trajectories are simulated in batches, with the parameters as NumPy
+arrays, and each batch is folded into a `QuantileSketch` and then
+discarded, so memory use does not depend on the number of runs.
+
+    samplers = dict(alpha=normal(0.0117, 0.002))
+    bands = run_ensemble(system, growth_func2, samplers, 10**6)
+    plot_bands(bands)
+"""
+
+from math import log
+
+import numpy as np
+import pandas as pd
+
+from .growth import bind_growth_func
+from .incremental import with_changes
+
+
+def normal(mean, std):
+    """Make a sampler for a normal distribution.
+
+    returns: function that takes (rng, size) and returns an array
+    """
+    def sample(rng, size):
+        return rng.normal(mean, std, size)
+    return sample
+
+
+def uniform(low, high):
+    """Make a sampler for a uniform distribution.
+
+    returns: function that takes (rng, size) and returns an array
+    """
+    def sample(rng, size):
+        return rng.uniform(low, high, size)
+    return sample
+
+
+class QuantileSketch:
+    """Streaming quantile estimates for several rows of positive values.
+
+    Values are counted in logarithmic buckets, so each quantile is
+    estimated within a relative error of `relative_accuracy`, using
+    memory proportional to the log of the range of the values.
+
+    num_rows: number of independent rows (for example, years)
+    relative_accuracy: bound on the relative error of the estimates
+    """
+
+    def __init__(self, num_rows, relative_accuracy=0.001):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = log(self.gamma)
+        self.num_rows = num_rows
+        self.offset = 0
+        self.counts = np.zeros((num_rows, 0), dtype=np.int64)
+        self.zeros = np.zeros(num_rows, dtype=np.int64)
+        self.total = np.zeros(num_rows, dtype=np.int64)
+
+    def add(self, row, values):
+        """Add a batch of values to one row.
+
+        Values that are zero or negative are counted as zero; NaNs are
+        ignored.
+
+        row: row index
+        values: array of values
+        """
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        positive = values[values > 0]
+        self.zeros[row] += len(values) - len(positive)
+        self.total[row] += len(values)
+        if len(positive) == 0:
+            return
+
+        keys = np.ceil(np.log(positive) / self.log_gamma).astype(np.int64)
+        self._expand(keys.min(), keys.max())
+        width = self.counts.shape[1]
+        self.counts[row] += np.bincount(keys - self.offset, minlength=width)
+
+    def _expand(self, low, high):
+        """Make room for bucket keys from `low` to `high`."""
+        width = self.counts.shape[1]
+        if width == 0:
+            self.offset = low
+            self.counts = np.zeros((self.num_rows, high - low + 1),
+                                   dtype=np.int64)
+            return
+
+        new_offset = min(self.offset, low)
+        new_end = max(self.offset + width, high + 1)
+        if new_offset == self.offset and new_end == self.offset + width:
+            return
+
+        counts = np.zeros((self.num_rows, new_end - new_offset),
+                          dtype=np.int64)
+        start = self.offset - new_offset
+        counts[:, start:start+width] = self.counts
+        self.offset = new_offset
+        self.counts = counts
+
+    def quantile(self, q):
+        """Estimate a quantile for every row.
+
+        q: fraction between 0 and 1
+
+        returns: array with one estimate per row, NaN for empty rows
+        """
+        rank = q * (self.total - 1)
+        result = np.full(self.num_rows, np.nan)
+
+        below = rank < self.zeros
+        result[below & (self.total > 0)] = 0
+
+        cumulative = np.cumsum(self.counts, axis=1) + self.zeros[:, None]
+        rows = ~below & (self.total > 0)
+        if self.counts.shape[1] and rows.any():
+            index = np.argmax(cumulative[rows] > rank[rows, None], axis=1)
+            keys = index + self.offset
+            result[rows] = 2 * self.gamma ** keys / (self.gamma + 1)
+        return result
+
+    def merge(self, other):
+        """Add the counts from another sketch with the same shape."""
+        if other.counts.shape[1]:
+            width = other.counts.shape[1]
+            self._expand(other.offset, other.offset + width - 1)
+            start = other.offset - self.offset
+            self.counts[:, start:start+width] += other.counts
+        self.zeros += other.zeros
+        self.total += other.total
+
+
+def run_ensemble(system, growth_func, samplers, num_runs,
+                 quantiles=(0.05, 0.5, 0.95), batch_size=10000,
+                 seed=None, relative_accuracy=0.001):
+    """Run many trajectories with sampled parameters.
+
+    system: System object with t_0, t_end, p_0 and default parameters
+    growth_func: function with signature growth_func(t, pop, system);
+                 it has to work when parameters are NumPy arrays
+    samplers: map from parameter name to a function that takes
+              (rng, size) and returns an array of samples
+    num_runs: number of trajectories
+    quantiles: sequence of quantiles to report
+    batch_size: number of trajectories simulated at the same time
+    seed: seed for the random number generator
+    relative_accuracy: bound on the relative error of the quantiles
+
+    returns: DataFrame indexed by year with one column per quantile
+    """
+    rng = np.random.default_rng(seed)
+    t_0, t_end = system.t_0, system.t_end
+    sketch = QuantileSketch(t_end - t_0 + 1, relative_accuracy)
+
+    for start in range(0, num_runs, batch_size):
+        size = min(batch_size, num_runs - start)
+        changes = {name: sample(rng, size)
+                   for name, sample in samplers.items()}
+        batch = with_changes(system, **changes)
+        growth = bind_growth_func(growth_func, batch)
+
+        pop = np.full(size, batch.p_0, dtype=float)
+        sketch.add(0, pop)
+        for t in range(t_0, t_end):
+            pop = pop + growth(t, pop)
+            sketch.add(t - t_0 + 1, pop)
+
+    return band_table(sketch, range(t_0, t_end+1), quantiles)
+
+
+def band_table(sketch, years, quantiles):
+    """Make a table of quantile bands from a sketch.
+
+    sketch: QuantileSketch with one row per year
+    years: sequence of years
+    quantiles: sequence of quantiles
+
+    returns: DataFrame indexed by year with one column per quantile
+    """
+    data = {q: sketch.quantile(q) for q in quantiles}
+    table = pd.DataFrame(data, index=pd.Index(years, name='Time'))
+    table.columns.name = 'quantile'
+    return table
+
+
+def plot_bands(table, color='C0', label='model'):
+    """Plot the median and the outermost band of an ensemble.
+
+    table: DataFrame returned by run_ensemble
+    color: color of the band and median line
+    label: label for the median line
+    """
+    import matplotlib.pyplot as plt
+
+    low, high = min(table.columns), max(table.columns)
+    plt.fill_between(table.index, table[low], table[high],
+                     color=color, alpha=0.2, linewidth=0,
+                     label='%g-%g%%' % (100 * low, 100 * high))
+    if 0.5 in table.columns:
+        table[0.5].plot(color=color, label=label)
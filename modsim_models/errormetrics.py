@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+"""Error metrics that update as population estimates arrive.
+
+population.compute_errors recomputes `abs(un - census)`, its mean and
+max, and the relative error from scratch over the whole series. The
+objects in this module keep running sums, counts and maxima instead, so
+a new year of estimates, or a refreshed value such as the NaN the UN
+has for 2016, updates every summary without rescanning history.
+
+Like the pandas reductions that compute_errors uses, the summaries skip
+years where either estimate is NaN.
+
+    metrics = ErrorMetrics.from_series(un, census)
+    metrics.update(2016, un=7.43)
+    metrics.summary()
+
+`ErrorMetrics` covers every year it has seen. `RollingErrorMetrics`
+covers the last `window` years, for monitoring jobs that append data
+continuously.
+"""
+
+import heapq
+from collections import deque
+from itertools import count
+from math import isnan
+
+
+def is_missing(x):
+    """Check whether an estimate is missing (None or NaN)."""
+    return x is None or isnan(x)
+
+
+def errors(un, census):
+    """Compute the absolute and relative error of one year.
+
+    returns: (abs_error, rel_error in percent), or None if either
+             estimate is missing
+    """
+    if is_missing(un) or is_missing(census):
+        return None
+    abs_error = abs(un - census)
+    return abs_error, 100 * abs_error / census
+
+
+def summarize(n, sum_abs, sum_rel, max_abs, max_rel):
+    """Make a summary dict with the keys used by compute_errors."""
+    nan = float('nan')
+    return dict(count=n,
+                mean_abs_error=sum_abs / n if n else nan,
+                max_abs_error=max_abs if n else nan,
+                mean_rel_error=sum_rel / n if n else nan,
+                max_rel_error=max_rel if n else nan)
+
+
+class LazyMaxHeap:
+    """Maximum of a set of keyed values that can change or be removed.
+
+    Changing or removing a value leaves its old heap entry in place;
+    stale entries are discarded when they reach the top. Each entry is
+    pushed and popped once, so operations take amortized O(log n), and
+    the heap is rebuilt when more than half of it is stale.
+    """
+
+    def __init__(self):
+        self.heap = []
+        self.current = {}
+        self.tokens = count()
+
+    def __len__(self):
+        return len(self.current)
+
+    def set(self, key, value):
+        """Set the value of a key."""
+        token = next(self.tokens)
+        self.current[key] = token
+        heapq.heappush(self.heap, (-value, token, key))
+        self.compact()
+
+    def remove(self, key):
+        """Remove a key, if present."""
+        self.current.pop(key, None)
+        self.compact()
+
+    def max(self, default=None):
+        """Get the largest value, or `default` if there are none."""
+        heap, current = self.heap, self.current
+        while heap and current.get(heap[0][2]) != heap[0][1]:
+            heapq.heappop(heap)
+        return -heap[0][0] if heap else default
+
+    def compact(self):
+        """Drop stale entries if they are most of the heap."""
+        if len(self.heap) > 2 * len(self.current) + 16:
+            current = self.current
+            self.heap = [entry for entry in self.heap
+                         if current.get(entry[2]) == entry[1]]
+            heapq.heapify(self.heap)
+
+
+class ErrorMetrics:
+    """Running error metrics over all years seen.
+
+    Updating one year takes O(1) for the sums and counts, and amortized
+    O(log n) for the maxima.
+    """
+
+    def __init__(self):
+        self.estimates = {}
+        self.n = 0
+        self.sum_abs = 0.0
+        self.sum_rel = 0.0
+        self.max_abs = LazyMaxHeap()
+        self.max_rel = LazyMaxHeap()
+
+    @classmethod
+    def from_series(cls, un, census):
+        """Make metrics from two Series of estimates indexed by year.
+
+        Years that are in only one Series count as missing, as in
+        `un - census`.
+        """
+        metrics = cls()
+        for year in un.index.union(census.index):
+            metrics.update(year, un.get(year), census.get(year))
+        return metrics
+
+    def update(self, year, un=None, census=None):
+        """Add or replace the estimates for one year.
+
+        year: year of the estimates
+        un: new UN estimate, or None to keep the current one
+        census: new Census estimate, or None to keep the current one
+        """
+        old_un, old_census = self.estimates.get(year, (None, None))
+        new_un = old_un if un is None else un
+        new_census = old_census if census is None else census
+        self.estimates[year] = new_un, new_census
+
+        old = errors(old_un, old_census)
+        if old is not None:
+            self.n -= 1
+            self.sum_abs -= old[0]
+            self.sum_rel -= old[1]
+
+        new = errors(new_un, new_census)
+        if new is not None:
+            self.n += 1
+            self.sum_abs += new[0]
+            self.sum_rel += new[1]
+            self.max_abs.set(year, new[0])
+            self.max_rel.set(year, new[1])
+        elif old is not None:
+            self.max_abs.remove(year)
+            self.max_rel.remove(year)
+
+    def abs_error(self, year):
+        """Absolute error of one year, or NaN if it is missing."""
+        result = errors(*self.estimates.get(year, (None, None)))
+        return float('nan') if result is None else result[0]
+
+    def rel_error(self, year):
+        """Relative error of one year in percent, or NaN if it is missing."""
+        result = errors(*self.estimates.get(year, (None, None)))
+        return float('nan') if result is None else result[1]
+
+    def summary(self):
+        """Summarize the errors.
+
+        returns: dict with count, mean_abs_error, max_abs_error,
+                 mean_rel_error and max_rel_error
+        """
+        return summarize(self.n, self.sum_abs, self.sum_rel,
+                         self.max_abs.max(), self.max_rel.max())
+
+
+class RollingErrorMetrics:
+    """Error metrics over the last `window` years.
+
+    Years are appended in increasing order, and the oldest ones expire
+    as the window moves. Appending takes amortized O(1): the sums and
+    counts are updated in place, and each maximum is the front of a
+    monotonic deque that holds the years that could still become the
+    maximum. Refreshing a year that is already in the window, such as
+    the latest UN estimate, rebuilds the deques in O(window).
+    """
+
+    def __init__(self, window):
+        """Make rolling metrics.
+
+        window: number of years covered, up to the latest year
+        """
+        self.window = window
+        self.entries = deque()
+        self.n = 0
+        self.sum_abs = 0.0
+        self.sum_rel = 0.0
+        self.max_abs = deque()
+        self.max_rel = deque()
+
+    def update(self, year, un=None, census=None):
+        """Append a new year, or refresh a year in the window.
+
+        year: year of the estimates; at least the latest year minus
+              `window - 1`
+        un: UN estimate, or None to keep the current one
+        census: Census estimate, or None to keep the current one
+        """
+        entries = self.entries
+        if not entries or year > entries[-1][0]:
+            self.append(year, un, census)
+            return
+
+        for entry in reversed(entries):
+            if entry[0] == year:
+                break
+        else:
+            raise KeyError('Year %s is not in the window, or is out of '
+                           'order' % year)
+
+        self.remove_errors(entry[3])
+        if un is not None:
+            entry[1] = un
+        if census is not None:
+            entry[2] = census
+        entry[3] = errors(entry[1], entry[2])
+        self.add_errors(entry[3])
+        self.rebuild_maxima()
+
+    def append(self, year, un, census):
+        """Add the latest year and expire the years outside the window."""
+        result = errors(un, census)
+        self.entries.append([year, un, census, result])
+        self.add_errors(result)
+        if result is not None:
+            push_monotonic(self.max_abs, year, result[0])
+            push_monotonic(self.max_rel, year, result[1])
+
+        first = year - self.window + 1
+        entries = self.entries
+        while entries[0][0] < first:
+            old_year, _, _, old = entries.popleft()
+            self.remove_errors(old)
+            for maxima in (self.max_abs, self.max_rel):
+                if maxima and maxima[0][0] == old_year:
+                    maxima.popleft()
+
+    def add_errors(self, result):
+        if result is not None:
+            self.n += 1
+            self.sum_abs += result[0]
+            self.sum_rel += result[1]
+
+    def remove_errors(self, result):
+        if result is not None:
+            self.n -= 1
+            self.sum_abs -= result[0]
+            self.sum_rel -= result[1]
+
+    def rebuild_maxima(self):
+        """Rebuild the monotonic deques from the entries in the window."""
+        self.max_abs.clear()
+        self.max_rel.clear()
+        for year, un, census, result in self.entries:
+            if result is not None:
+                push_monotonic(self.max_abs, year, result[0])
+                push_monotonic(self.max_rel, year, result[1])
+
+    def summary(self):
+        """Summarize the errors in the window.
+
+        returns: dict with count, mean_abs_error, max_abs_error,
+                 mean_rel_error and max_rel_error
+        """
+        max_abs = self.max_abs[0][1] if self.max_abs else None
+        max_rel = self.max_rel[0][1] if self.max_rel else None
+        return summarize(self.n, self.sum_abs, self.sum_rel,
+                         max_abs, max_rel)
+
+
+def push_monotonic(maxima, year, value):
+    """Append to a deque of (year, value) kept in decreasing order.
+
+    Older entries with values no larger than the new one can never be
+    the maximum again, so they are dropped.
+    """
+    while maxima and maxima[-1][1] <= value:
+        maxima.pop()
+    maxima.append((year, value))
@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+"""Download data files concurrently and keep them up to date.
+
+`fetch` replaces the `download` helper from the notebooks. It retrieves
+several files at the same time, reusing one HTTP connection per host in
+each worker thread, and writes each file atomically, so an interrupted
+download never leaves a truncated file behind.
+
+For each file it keeps a small `<filename>.meta.json` with the ETag,
+Last-Modified date and SHA-256 of the contents. The next time, it sends
+a conditional request and skips the download if the server says the
+file has not changed, but only if the file on disk still matches the
+recorded checksum.
+
+    fetch([MODSIM_URL, DATA_URL])
+"""
+
+import hashlib
+import http.client
+import json
+import os
+import tempfile
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from os.path import basename, exists, join
+from urllib.parse import urljoin, urlsplit
+
+MODSIM_URL = ('https://raw.githubusercontent.com/AllenDowney/' +
+              'ModSimPy/master/modsim.py')
+
+CHUNK_SIZE = 1 << 16
+MAX_REDIRECTS = 5
+
+FetchResult = namedtuple('FetchResult', ['url', 'filename', 'status'])
+
+
+class FetchError(OSError):
+    """Raised when a file cannot be downloaded or fails verification."""
+
+
+class ConnectionPool:
+    """Keep one open connection per (scheme, host) in each thread.
+
+    `close` closes the connections of every thread.
+
+    timeout: socket timeout in seconds
+    """
+
+    def __init__(self, timeout=30):
+        self.timeout = timeout
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.open = set()
+
+    def connection(self, scheme, netloc):
+        """Get an open connection, creating it if needed."""
+        connections = getattr(self.local, 'connections', None)
+        if connections is None:
+            connections = self.local.connections = {}
+
+        key = scheme, netloc
+        conn = connections.get(key)
+        if conn is None:
+            if scheme == 'https':
+                conn = http.client.HTTPSConnection(netloc,
+                                                   timeout=self.timeout)
+            elif scheme == 'http':
+                conn = http.client.HTTPConnection(netloc,
+                                                  timeout=self.timeout)
+            else:
+                raise FetchError('Unsupported URL scheme: %s' % scheme)
+            connections[key] = conn
+            with self.lock:
+                self.open.add(conn)
+        return conn
+
+    def discard(self, scheme, netloc):
+        """Close and forget a connection, for example after an error."""
+        connections = getattr(self.local, 'connections', {})
+        conn = connections.pop((scheme, netloc), None)
+        if conn is not None:
+            with self.lock:
+                self.open.discard(conn)
+            conn.close()
+
+    def request(self, url, headers):
+        """Send a GET request, retrying once on a stale connection.
+
+        returns: HTTPResponse
+        """
+        parts = urlsplit(url)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+
+        for attempt in range(2):
+            conn = self.connection(parts.scheme, parts.netloc)
+            try:
+                conn.request('GET', path, headers=headers)
+                return conn.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionResetError,
+                    BrokenPipeError):
+                self.discard(parts.scheme, parts.netloc)
+                if attempt:
+                    raise
+
+    def close(self):
+        """Close the open connections of all threads.
+
+        Call it when the threads are done with the pool.
+        """
+        with self.lock:
+            open_connections, self.open = self.open, set()
+        for conn in open_connections:
+            conn.close()
+        getattr(self.local, 'connections', {}).clear()
+
+
+def file_sha256(filename):
+    """Compute the SHA-256 of a file.
+
+    returns: hex digest
+    """
+    sha = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def read_meta(filename):
+    """Read the metadata recorded for a downloaded file, or {}."""
+    try:
+        with open(filename + '.meta.json') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_meta(filename, meta):
+    """Record metadata for a downloaded file."""
+    atomic_write(filename + '.meta.json',
+                 [json.dumps(meta, indent=2).encode('utf-8')])
+
+
+def atomic_write(filename, chunks, sha256=None):
+    """Write chunks of bytes to a file, replacing it atomically.
+
+    The chunks go to a temporary file in the same directory, which is
+    renamed to `filename` only if it is complete and, when `sha256` is
+    given, has the expected checksum.
+
+    filename: path of the file
+    chunks: iterable of bytes
+    sha256: expected SHA-256 of the contents, or None
+
+    returns: SHA-256 of the contents
+    """
+    directory = os.path.dirname(os.path.abspath(filename))
+    sha = hashlib.sha256()
+    fd, temp = tempfile.mkstemp(dir=directory,
+                                prefix='.' + basename(filename) + '.')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in chunks:
+                sha.update(chunk)
+                f.write(chunk)
+        digest = sha.hexdigest()
+        if sha256 is not None and digest != sha256:
+            raise FetchError('Checksum mismatch for %s: expected %s, '
+                             'got %s' % (filename, sha256, digest))
+        os.replace(temp, filename)
+    except BaseException:
+        os.unlink(temp)
+        raise
+    return digest
+
+
+def read_body(response):
+    """Read a response in chunks, checking the Content-Length.
+
+    returns: iterator of bytes
+    """
+    expected = response.getheader('Content-Length')
+    received = 0
+    for chunk in iter(lambda: response.read(CHUNK_SIZE), b''):
+        received += len(chunk)
+        yield chunk
+    if expected is not None and received != int(expected):
+        raise FetchError('Truncated download: got %d of %s bytes' %
+                         (received, expected))
+
+
+def fetch_one(pool, url, filename, sha256=None):
+    """Download one file unless the copy on disk is current.
+
+    pool: ConnectionPool
+    url: URL of the file
+    filename: local path
+    sha256: expected SHA-256 of the contents, or None
+
+    returns: FetchResult
+    """
+    meta = read_meta(filename)
+    headers = {}
+    if exists(filename) and meta.get('url') == url:
+        if file_sha256(filename) == meta.get('sha256'):
+            if sha256 is None or sha256 == meta['sha256']:
+                if meta.get('etag'):
+                    headers['If-None-Match'] = meta['etag']
+                if meta.get('last_modified'):
+                    headers['If-Modified-Since'] = meta['last_modified']
+
+    location = url
+    for i in range(MAX_REDIRECTS + 1):
+        response = pool.request(location, headers)
+        if response.status in (301, 302, 303, 307, 308):
+            response.read()
+            location = urljoin(location, response.getheader('Location'))
+            continue
+        break
+    else:
+        raise FetchError('Too many redirects for %s' % url)
+
+    if response.status == 304:
+        response.read()
+        return FetchResult(url, filename, 'not modified')
+
+    if response.status != 200:
+        response.read()
+        raise FetchError('%s: HTTP %d %s' %
+                         (url, response.status, response.reason))
+
+    try:
+        digest = atomic_write(filename, read_body(response), sha256)
+    except BaseException:
+        pool.discard(*urlsplit(location)[:2])
+        raise
+
+    write_meta(filename, dict(url=url,
+                              sha256=digest,
+                              etag=response.getheader('ETag'),
+                              last_modified=response.getheader(
+                                  'Last-Modified')))
+    return FetchResult(url, filename, 'downloaded')
+
+
+def fetch(urls, directory='.', checksums=None, max_workers=4, timeout=30):
+    """Download several files concurrently.
+
+    urls: sequence of URLs
+    directory: where to put the files; names come from the URLs
+    checksums: map from URL to expected SHA-256, optional
+    max_workers: number of concurrent downloads
+    timeout: socket timeout in seconds
+
+    returns: list of FetchResult, in the same order as urls
+    """
+    checksums = checksums or {}
+    pool = ConnectionPool(timeout)
+
+    def task(url):
+        filename = join(directory, basename(urlsplit(url).path))
+        return fetch_one(pool, url, filename, checksums.get(url))
+
+    try:
+        with ThreadPoolExecutor(max_workers) as executor:
+            results = list(executor.map(task, urls))
+    finally:
+        pool.close()
+    return results
@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""Growth models for world population.
+
+Importable versions of the functions developed in richard_gbamara_6.py,
+so they can be reused without running the notebook.
+
+The simulation loops read the parameters they need into local variables
+before iterating. Each growth function has a `bind` attribute that does
+the same thing for `run_simulation`: given a System, it returns a
+function of `(t, pop)` with the parameters already bound.
+"""
+
+from contextlib import nullcontext
+from time import perf_counter_ns
+
+from . import core
+from . import profiling
+from .core import TimeSeries, growth_kernel
+
+
+def run_simulation1(system):
+    """Simulate the constant growth model.
+
+    system: System object with t_0, t_end, p_0 and annual_growth
+
+    returns: TimeSeries
+    """
+    t_0, t_end = system.t_0, system.t_end
+    annual_growth = system.annual_growth
+
+    profiler = profiling.current
+    if profiler is not None:
+        def update(t, pop):
+            return pop + annual_growth
+        return run_profiled('run_simulation1', system, update, profiler)
+
+    pop = system.p_0
+    values = [pop]
+    for t in range(t_0, t_end):
+        pop = pop + annual_growth
+        values.append(pop)
+
+    return TimeSeries(values, index=range(t_0, t_end+1))
+
+
+def run_simulation2(system):
+    """Simulate the proportional growth model.
+
+    system: System object with t_0, t_end, p_0, birth_rate and death_rate
+
+    returns: TimeSeries
+    """
+    t_0, t_end = system.t_0, system.t_end
+    birth_rate, death_rate = system.birth_rate, system.death_rate
+
+    profiler = profiling.current
+    if profiler is not None:
+        def update(t, pop):
+            births = birth_rate * pop
+            deaths = death_rate * pop
+            return pop + births - deaths
+        return run_profiled('run_simulation2', system, update, profiler)
+
+    pop = system.p_0
+    values = [pop]
+    for t in range(t_0, t_end):
+        births = birth_rate * pop
+        deaths = death_rate * pop
+        pop = pop + births - deaths
+        values.append(pop)
+
+    return TimeSeries(values, index=range(t_0, t_end+1))
+
+
+def growth_func1(t, pop, system):
+    """Compute the population next year with separate birth and death rates.
+
+    t: current year
+    pop: current population
+    system: System object containing parameters of the model
+
+    returns: net growth
+    """
+    births = system.birth_rate * pop
+    deaths = system.death_rate * pop
+    return births - deaths
+
+
+def bind_growth_func1(system):
+    """Make growth_func1 with the parameters read into locals."""
+    birth_rate, death_rate = system.birth_rate, system.death_rate
+
+    def growth(t, pop):
+        births = birth_rate * pop
+        deaths = death_rate * pop
+        return births - deaths
+
+    return growth
+
+
+growth_func1.bind = bind_growth_func1
+
+
+def growth_func2(t, pop, system):
+    """Compute the population next year with a single net growth rate.
+
+    t: current year
+    pop: current population
+    system: System object containing parameters of the model
+
+    returns: net growth
+    """
+    return system.alpha * pop
+
+
+def bind_growth_func2(system):
+    """Make growth_func2 with the parameters read into locals."""
+    alpha = system.alpha
+
+    def growth(t, pop):
+        return alpha * pop
+
+    return growth
+
+
+growth_func2.bind = bind_growth_func2
+
+
+def growth_func3(t, pop, system):
+    """Compute growth with a rate that changes in 1980.
+
+    t: current year
+    pop: current population
+    system: System object containing parameters of the model
+
+    returns: net growth
+    """
+    if t < 1980:
+        return system.alpha1 * pop
+    else:
+        return system.alpha2 * pop
+
+
+def bind_growth_func3(system):
+    """Make growth_func3 with the parameters read into locals."""
+    alpha1, alpha2 = system.alpha1, system.alpha2
+
+    def growth(t, pop):
+        if t < 1980:
+            return alpha1 * pop
+        else:
+            return alpha2 * pop
+
+    return growth
+
+
+growth_func3.bind = bind_growth_func3
+
+
+def bind_growth_func(growth_func, system):
+    """Make a version of a growth function with the System bound.
+
+    Uses the function's `bind` attribute if it has one, so the parameters
+    are read once; otherwise the System is passed on every call.
+
+    growth_func: function with signature growth_func(t, pop, system)
+    system: System object
+
+    returns: function with signature growth(t, pop)
+    """
+    bind = getattr(growth_func, 'bind', None)
+    if bind is not None:
+        return bind(system)
+
+    def growth(t, pop):
+        return growth_func(t, pop, system)
+
+    return growth
+
+
+def run_simulation(system, growth_func):
+    """Simulate the system using any update function.
+
+    system: System object
+    growth_func: function that computes the population next year
+
+    returns: TimeSeries
+    """
+    t_0, t_end = system.t_0, system.t_end
+    growth = bind_growth_func(growth_func, system)
+
+    profiler = profiling.current
+    if profiler is not None:
+        add_time = profiler.add_time
+
+        def update(t, pop):
+            start = perf_counter_ns()
+            net = growth(t, pop)
+            add_time('growth_func', perf_counter_ns() - start)
+            return pop + net
+        return run_profiled('run_simulation', system, update, profiler)
+
+    values = growth_kernel(t_0, t_end, system.p_0, growth)
+    return TimeSeries(values, index=range(t_0, t_end+1))
+
+
+def plot_results(results, title):
+    """Plot the results of a growth model.
+
+    Long results are downsampled before drawing; see plotting.py.
+
+    results: TimeSeries
+    title: string
+    """
+    from .plotting import plot_series
+
+    profiler = profiling.current
+    timer = profiler.phase('plot') if profiler else nullcontext()
+
+    with timer:
+        plot_series(results, label='model', color='gray')
+        core.decorate(title=title)
+
+
+def run_profiled(name, system, update, profiler):
+    """Run a growth simulation loop with instrumentation.
+
+    name: name of the simulation, used to label timers and histograms
+    system: System object with t_0, t_end and p_0
+    update: function that takes (t, pop) and returns the next population
+    profiler: Profiler object
+
+    returns: TimeSeries
+    """
+    t_0, t_end = system.t_0, system.t_end
+    add_time = profiler.add_time
+    histogram = profiler.histogram('growth.' + name + '.step')
+    sample_every = profiler.sample_every
+
+    with profiler.phase('growth.' + name):
+        pop = system.p_0
+        values = [pop]
+        for t in range(t_0, t_end):
+            start = perf_counter_ns()
+            pop = update(t, pop)
+            if (t - t_0) % sample_every == 0:
+                histogram.add(perf_counter_ns() - start)
+
+            start = perf_counter_ns()
+            values.append(pop)
+            add_time('record', perf_counter_ns() - start)
+
+        with profiler.phase('record'):
+            results = TimeSeries(values, index=range(t_0, t_end+1))
+
+    profiler.count('growth.steps', t_end - t_0)
+    return results
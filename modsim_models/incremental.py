@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""Incremental re-simulation of growth models.
+
+When only a late-period parameter changes (for example `alpha2` in
+`growth_func3`), the trajectory before the change point is unchanged.
+`IncrementalSimulation` records which `System` fields each range of
+years read, and on `update` recomputes only the affected suffix,
+starting from the cached population of the first affected year.
+"""
+
+from copy import copy
+
+from .core import TimeSeries
+
+# fields read by the simulation driver itself rather than growth_func
+START_FIELDS = frozenset(['t_0', 'p_0'])
+
+
+class ReadRecorder:
+    """Wrap a System and record the names of the fields that are read.
+
+    system: System object
+    """
+
+    def __init__(self, system):
+        object.__setattr__(self, '_system', system)
+        object.__setattr__(self, 'reads', set())
+
+    def __getattr__(self, name):
+        self.reads.add(name)
+        return getattr(self._system, name)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('growth functions should not modify the system')
+
+
+def with_changes(system, **changes):
+    """Make a copy of a System with some fields replaced.
+
+    system: System object
+    changes: new values for fields
+
+    returns: new System object
+    """
+    if hasattr(system, 'set'):
+        return system.set(**changes)
+    new = copy(system)
+    for name, value in changes.items():
+        setattr(new, name, value)
+    return new
+
+
+class IncrementalSimulation:
+    """Run a growth model and re-run only what a parameter change affects.
+
+    system: System object with t_0, t_end and p_0
+    growth_func: function with signature growth_func(t, pop, system)
+    """
+
+    def __init__(self, system, growth_func):
+        self.system = system
+        self.growth_func = growth_func
+        self.values = []
+        self.ranges = []
+        self.steps_computed = 0
+
+    def run(self):
+        """Simulate from t_0 to t_end, discarding any cached state.
+
+        returns: TimeSeries
+        """
+        self.values = [self.system.p_0]
+        self.ranges = []
+        self._simulate_from(self.system.t_0)
+        return self.results()
+
+    def update(self, **changes):
+        """Change some parameters and recompute the affected years.
+
+        changes: new values for System fields
+
+        returns: TimeSeries
+        """
+        if not self.values:
+            self.system = with_changes(self.system, **changes)
+            return self.run()
+
+        old_end = self.system.t_end
+        self.system = with_changes(self.system, **changes)
+        changed = frozenset(changes)
+
+        if changed & START_FIELDS:
+            return self.run()
+
+        t_start = self.first_affected(changed)
+        t_start = min(t_start, old_end, self.system.t_end)
+        self._truncate(t_start)
+        self._simulate_from(t_start)
+        return self.results()
+
+    def first_affected(self, changed):
+        """Find the first year whose growth read one of the changed fields.
+
+        changed: set of field names
+
+        returns: year, or the end of the cached trajectory if none
+        """
+        for start, end, fields in self.ranges:
+            if fields & changed:
+                return start
+        return self.system.t_0 + len(self.values) - 1
+
+    def read_ranges(self):
+        """List the fields read by each range of years.
+
+        returns: list of (first year, last year, set of field names)
+        """
+        return [(start, end - 1, set(fields))
+                for start, end, fields in self.ranges]
+
+    def results(self):
+        """Make a TimeSeries from the cached trajectory.
+
+        returns: TimeSeries
+        """
+        t_0 = self.system.t_0
+        index = range(t_0, t_0 + len(self.values))
+        return TimeSeries(list(self.values), index=index)
+
+    def _truncate(self, t_start):
+        """Drop cached values and reads after year `t_start`."""
+        t_0 = self.system.t_0
+        del self.values[t_start - t_0 + 1:]
+
+        ranges = []
+        for start, end, fields in self.ranges:
+            if start >= t_start:
+                break
+            ranges.append((start, min(end, t_start), fields))
+        self.ranges = ranges
+
+    def _simulate_from(self, t_start):
+        """Compute values from year `t_start` to t_end."""
+        system = self.system
+        growth_func = self.growth_func
+        values = self.values
+        ranges = self.ranges
+        t_0 = system.t_0
+
+        pop = values[t_start - t_0]
+        for t in range(t_start, system.t_end):
+            recorder = ReadRecorder(system)
+            pop = pop + growth_func(t, pop, recorder)
+            values.append(pop)
+
+            fields = frozenset(recorder.reads)
+            if ranges and ranges[-1][1] == t and ranges[-1][2] == fields:
+                start, _, _ = ranges[-1]
+                ranges[-1] = (start, t + 1, fields)
+            else:
+                ranges.append((t, t + 1, fields))
+
+        self.steps_computed = max(system.t_end - t_start, 0)
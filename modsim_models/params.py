@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""Immutable, slotted parameter objects.
+
+`Params` is a drop-in replacement for a modsim `System` in the growth
+models: fields are read with the same attribute syntax, but they live in
+`__slots__`, so reading one is a plain descriptor lookup, and the object
+cannot be modified. Instead of `system.alpha = ...`, use
+`system = system.set(alpha=...)`.
+
+Because `Params` objects are immutable, they are hashable and can be
+used as keys in a cache of simulation results.
+"""
+
+_classes = {}
+
+
+def params_class(fields):
+    """Get the Params subclass with the given fields, creating it if needed.
+
+    fields: tuple of field names; names of Params attributes, such as
+            `set`, `items` or `_hash`, are reserved
+
+    returns: class
+    """
+    cls = _classes.get(fields)
+    if cls is None:
+        reserved = [name for name in fields if hasattr(Params, name)]
+        if reserved:
+            raise ValueError('Reserved field names: %s' %
+                             ', '.join(reserved))
+        namespace = dict(__slots__=fields, _fields=fields)
+        cls = type('Params', (Params,), namespace)
+        _classes[fields] = cls
+    return cls
+
+
+class Params:
+    """Immutable collection of named model parameters.
+
+    Create one with keyword arguments, like a System:
+
+        system = Params(t_0=1950, t_end=2016, p_0=2.5, alpha=0.025)
+    """
+
+    __slots__ = ('_hash',)
+    _fields = ()
+
+    def __new__(cls, **fields):
+        if cls is Params or tuple(fields) != cls._fields:
+            cls = params_class(tuple(fields))
+        self = object.__new__(cls)
+        for name, value in fields.items():
+            object.__setattr__(self, name, value)
+        object.__setattr__(self, '_hash', None)
+        return self
+
+    @classmethod
+    def from_system(cls, system):
+        """Make a Params object with the same fields as a System.
+
+        system: System object, Series, or mapping
+
+        returns: Params
+        """
+        if isinstance(system, Params):
+            return system
+        if hasattr(system, 'items'):
+            return cls(**dict(system.items()))
+        return cls(**vars(system))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Params object is immutable; "
+                             "use set(%s=...) to make a copy" % name)
+
+    def __delattr__(self, name):
+        raise AttributeError('Params object is immutable')
+
+    def __reduce__(self):
+        return (_rebuild, (self.asdict(),))
+
+    def set(self, **changes):
+        """Make a copy with some fields replaced or added.
+
+        changes: new values for fields
+
+        returns: Params
+        """
+        fields = self.asdict()
+        fields.update(changes)
+        return Params(**fields)
+
+    def get(self, name, default=None):
+        """Get a field, or a default value if it does not exist."""
+        return getattr(self, name, default)
+
+    def bind(self, *names):
+        """Get the values of several fields, for unpacking into locals.
+
+            birth_rate, death_rate = system.bind('birth_rate', 'death_rate')
+
+        names: field names
+
+        returns: tuple of values
+        """
+        return tuple(getattr(self, name) for name in names)
+
+    def asdict(self):
+        """Get the fields as a dictionary.
+
+        returns: dict
+        """
+        return {name: getattr(self, name) for name in self._fields}
+
+    def items(self):
+        return self.asdict().items()
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __contains__(self, name):
+        return name in self._fields
+
+    def __eq__(self, other):
+        if not isinstance(other, Params):
+            return NotImplemented
+        return self.asdict() == other.asdict()
+
+    def __hash__(self):
+        if self._hash is None:
+            items = tuple(sorted(self.items()))
+            object.__setattr__(self, '_hash', hash(items))
+        return self._hash
+
+    def __repr__(self):
+        args = ', '.join('%s=%r' % item for item in self.items())
+        return 'Params(%s)' % args
+
+
+def _rebuild(fields):
+    """Recreate a Params object when unpickling."""
+    return Params(**fields)
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""Plot very long TimeSeries without drawing every point.
+
+A million-step simulation produces more points than a figure has
+pixels, and matplotlib takes longer to draw them than the simulation
+took to compute them. `plot_series` reduces long series before drawing,
+with one of two shape-preserving methods:
+
+- 'lttb' (Largest-Triangle-Three-Buckets) keeps, from each bucket, the
+  point that forms the largest triangle with its neighbors, which
+  preserves the visual shape of the line;
+
+- 'minmax' keeps the minimum and maximum of each bucket, which
+  preserves the envelope, including isolated spikes.
+
+Short series are plotted unchanged, and the result is an ordinary
+Series plot, so `decorate` and `plot_estimates` work the same way.
+"""
+
+import numpy as np
+
+MAX_POINTS = 2000
+
+
+def lttb_indices(x, y, num_out):
+    """Choose points with Largest-Triangle-Three-Buckets.
+
+    x: array of x values, increasing
+    y: array of y values
+    num_out: number of points to keep, at least 3
+
+    returns: array of indices into x and y
+    """
+    n = len(x)
+    if num_out >= n or num_out < 3:
+        return np.arange(n)
+
+    # the first and last points are always kept; the rest are divided
+    # into num_out - 2 buckets
+    edges = np.linspace(1, n - 1, num_out - 1).astype(int)
+    indices = np.empty(num_out, dtype=int)
+    indices[0] = 0
+    indices[-1] = n - 1
+
+    selected = 0
+    for i in range(num_out - 2):
+        start, stop = edges[i], edges[i+1]
+
+        # average of the next bucket, or the last point
+        if i + 2 < len(edges):
+            next_start, next_stop = edges[i+1], edges[i+2]
+            x_next = x[next_start:next_stop].mean()
+            y_next = y[next_start:next_stop].mean()
+        else:
+            x_next, y_next = x[n-1], y[n-1]
+
+        x_a, y_a = x[selected], y[selected]
+        xs, ys = x[start:stop], y[start:stop]
+        areas = np.abs((x_a - x_next) * (ys - y_a) -
+                       (x_a - xs) * (y_next - y_a))
+        selected = start + int(np.argmax(areas))
+        indices[i+1] = selected
+
+    return indices
+
+
+def minmax_indices(y, num_buckets):
+    """Choose the minimum and maximum of each bucket.
+
+    y: array of y values
+    num_buckets: number of buckets
+
+    returns: sorted array of indices, at most 2 per bucket
+    """
+    n = len(y)
+    if 2 * num_buckets >= n:
+        return np.arange(n)
+
+    width = -(-n // num_buckets)
+    padded = np.full(width * num_buckets, np.nan)
+    padded[:n] = y
+    padded = padded.reshape(num_buckets, width)
+
+    # buckets past the end of a short series are all NaN; skip them
+    rows = np.flatnonzero(~np.isnan(padded).all(axis=1))
+    starts = rows * width
+    low = starts + np.nanargmin(padded[rows], axis=1)
+    high = starts + np.nanargmax(padded[rows], axis=1)
+    return np.unique(np.concatenate([low, high]))
+
+
+def downsample(series, max_points=MAX_POINTS, method='lttb'):
+    """Reduce a Series to at most `max_points` points.
+
+    series: Series or TimeSeries with a numeric index
+    max_points: maximum number of points to keep
+    method: 'lttb' or 'minmax'
+
+    returns: Series
+    """
+    if len(series) <= max_points:
+        return series
+
+    y = np.asarray(series.values, dtype=float)
+    if method == 'lttb':
+        x = np.asarray(series.index, dtype=float)
+        indices = lttb_indices(x, y, max_points)
+    elif method == 'minmax':
+        indices = minmax_indices(y, max_points // 2)
+    else:
+        raise ValueError("method should be 'lttb' or 'minmax', not %r" %
+                         (method,))
+    return series.iloc[indices]
+
+
+def plot_series(series, max_points=MAX_POINTS, method='lttb', **options):
+    """Plot a Series, downsampling it first if it is long.
+
+    series: Series or TimeSeries
+    max_points: maximum number of points to draw
+    method: 'lttb' or 'minmax'
+    options: passed to Series.plot
+    """
+    downsample(series, max_points, method).plot(**options)
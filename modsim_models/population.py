@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""World population estimates.
+
+Importable versions of the data loading and error computations from
+richard_gbamara_5.py.
+"""
+
+from . import core
+
+DATA_URL = ('https://raw.githubusercontent.com/AllenDowney/' +
+            'ModSimPy/master/data/World_population_estimates.html')
+
+COLUMNS = ['census', 'prb', 'un', 'maddison',
+           'hyde', 'tanton', 'biraben', 'mj',
+           'thomlinson', 'durand', 'clark']
+
+
+def download(url):
+    """Download a file into the current directory if it has changed."""
+    from .fetch import fetch
+
+    for result in fetch([url]):
+        if result.status == 'downloaded':
+            print('Downloaded ' + result.filename)
+
+
+def read_table2(filename='World_population_estimates.html'):
+    """Read the table of world population estimates from 1950 to 2016.
+
+    filename: path of the HTML page from Wikipedia
+
+    returns: DataFrame with one column per source
+    """
+    from pandas import read_html
+
+    tables = read_html(filename, header=0, index_col=0, decimal='M')
+    table2 = tables[2]
+    table2.columns = COLUMNS
+    return table2
+
+
+def load_estimates(filename='World_population_estimates.html'):
+    """Load the US Census and UN DESA estimates in billions.
+
+    filename: path of the HTML page from Wikipedia
+
+    returns: census, un as Series indexed by year
+    """
+    table2 = read_table2(filename)
+    census = table2.census / 1e9
+    un = table2.un / 1e9
+    return census, un
+
+
+def compute_errors(un, census):
+    """Compare two sets of estimates.
+
+    un: Series of estimates
+    census: Series of estimates
+
+    returns: dictionary with abs_error and rel_error Series and
+             their summary statistics
+    """
+    from numpy import abs, max, mean
+
+    abs_error = abs(un - census)
+    rel_error = 100 * abs_error / census
+    return dict(abs_error=abs_error,
+                mean_abs_error=mean(abs_error),
+                max_abs_error=max(abs_error),
+                rel_error=rel_error,
+                mean_rel_error=mean(rel_error))
+
+
+def plot_estimates(census, un):
+    """Plot the US Census and UN DESA estimates.
+
+    census: Series of estimates
+    un: Series of estimates
+    """
+    census.plot(style=':', label='US Census')
+    un.plot(style='--', label='UN DESA')
+    core.decorate(xlabel='Year',
+                  ylabel='World population (billions)')
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""Opt-in instrumentation for the simulations.
+
+The simulation entry points in bikeshare.py and growth.py check
+`profiling.current` once per call. When it is None, which is the
+default, they run their normal loops and pay nothing else. When a
+Profiler is enabled, they switch to instrumented loops that count
+events, time each phase, and sample per-step latency.
+
+    with Profiler() as profiler:
+        run_simulation(bikeshare, 0.3, 0.2, 60)
+    print(profiler.to_json())
+"""
+
+from contextlib import contextmanager
+from time import perf_counter_ns
+
+# the Profiler that is currently enabled, or None
+current = None
+
+
+class Histogram:
+    """Latency histogram with power-of-two buckets, in nanoseconds."""
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0
+
+    def add(self, ns):
+        """Record one latency.
+
+        ns: elapsed time in nanoseconds
+        """
+        bucket = max(ns, 1).bit_length()
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += ns
+
+    def quantile(self, q):
+        """Estimate a quantile from the buckets.
+
+        q: fraction between 0 and 1
+
+        returns: upper bound of the bucket that contains it, in ns
+        """
+        if self.count == 0:
+            return 0
+        target = q * self.count
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= target:
+                return 2 ** bucket
+        return 2 ** max(self.buckets)
+
+    def report(self):
+        """Summarize the histogram as a dictionary."""
+        mean = self.total / self.count if self.count else 0
+        return dict(count=self.count,
+                    mean_ns=mean,
+                    p50_ns=self.quantile(0.5),
+                    p99_ns=self.quantile(0.99),
+                    buckets={str(2 ** b): n
+                             for b, n in sorted(self.buckets.items())})
+
+
+class Profiler:
+    """Counters, per-phase timers and sampled step latencies.
+
+    sample_every: time one step in every `sample_every`
+    """
+
+    def __init__(self, sample_every=100):
+        self.sample_every = sample_every
+        self.counters = {}
+        self.timers = {}
+        self.latency = {}
+        self._previous = None
+
+    def count(self, name, n=1):
+        """Increment a counter."""
+        self.counters[name] = self.counters.get(name, 0) + int(n)
+
+    def add_time(self, name, ns):
+        """Add elapsed time to a phase timer.
+
+        name: phase name
+        ns: elapsed time in nanoseconds
+        """
+        timer = self.timers.get(name)
+        if timer is None:
+            self.timers[name] = [1, ns]
+        else:
+            timer[0] += 1
+            timer[1] += ns
+
+    @contextmanager
+    def phase(self, name):
+        """Time a block of code as one call to a phase."""
+        start = perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.add_time(name, perf_counter_ns() - start)
+
+    def histogram(self, name):
+        """Get the latency histogram with the given name, creating it."""
+        histogram = self.latency.get(name)
+        if histogram is None:
+            histogram = self.latency[name] = Histogram()
+        return histogram
+
+    def enable(self):
+        """Make this the current profiler."""
+        global current
+        self._previous = current
+        current = self
+        return self
+
+    def disable(self):
+        """Restore the profiler that was current before `enable`."""
+        global current
+        current = self._previous
+        self._previous = None
+
+    def __enter__(self):
+        return self.enable()
+
+    def __exit__(self, *exc_info):
+        self.disable()
+
+    def report(self):
+        """Summarize everything recorded so far.
+
+        returns: dictionary that can be serialized as JSON
+        """
+        timers = {}
+        for name, (calls, ns) in sorted(self.timers.items()):
+            timers[name] = dict(calls=calls,
+                                total_s=ns / 1e9,
+                                mean_ns=ns / calls)
+        latency = {name: histogram.report()
+                   for name, histogram in sorted(self.latency.items())}
+        return dict(counters=dict(sorted(self.counters.items())),
+                    timers=timers,
+                    latency=latency,
+                    sample_every=self.sample_every)
+
+    def to_json(self, filename=None):
+        """Export the report as JSON.
+
+        filename: if given, write the report to this file
+
+        returns: JSON string
+        """
+        import json
+
+        text = json.dumps(self.report(), indent=2)
+        if filename is not None:
+            with open(filename, 'w') as f:
+                f.write(text)
+        return text
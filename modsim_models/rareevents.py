@@ -0,0 +1,368 @@
+# -*- coding: utf-8 -*-
+"""Estimate the probability of rare bikeshare shortages.
+
+Events like "more than 20 unhappy customers in an hour" at p1=0.3,
+p2=0.2 happen so rarely that plain Monte Carlo needs millions of runs
+to see them at all. This module provides two estimators that spend
+their simulated steps on the runs that matter:
+
+- `importance_sampling` runs the model with tilted arrival
+  probabilities, which make shortages common, and weights each run by
+  its likelihood ratio, so the estimate is still unbiased for the
+  original probabilities. `cross_entropy_tilt` chooses the tilts.
+
+- `splitting` uses multilevel splitting: the unhappy-customer count
+  has to pass a sequence of intermediate levels on the way to the
+  threshold. The runs that reach a level are cloned, and continue from
+  where they were, until the next level; the estimate is the product of
+  the fractions that reach each level.
+
+`crude_monte_carlo` is the baseline. Each estimator returns a dict with
+the estimate, its standard error, its relative error and the number of
+simulated steps, so they can be compared at equal effort.
+
+    hour = dict(olin=10, wellesley=2, p1=0.3, p2=0.2, num_steps=60)
+    importance_sampling(hour, threshold=20, runs=10000)
+"""
+
+import random
+from math import exp, log, sqrt
+
+from .core import bikeshare_kernel
+
+
+def unhappy(final):
+    """Total unhappy customers from the final state of bikeshare_kernel."""
+    return final[2] + final[3]
+
+
+def summarize(values, steps):
+    """Summarize independent, unbiased samples of a probability.
+
+    values: list of samples
+    steps: number of simulated steps used to produce them
+
+    returns: dict with estimate, stderr, relative_error, runs and steps
+    """
+    n = len(values)
+    mean = sum(values) / n
+    var = sum((x - mean)**2 for x in values) / (n - 1) if n > 1 else 0.0
+    stderr = sqrt(var / n)
+    relative = stderr / mean if mean > 0 else float('inf')
+    return dict(estimate=mean, stderr=stderr, relative_error=relative,
+                runs=n, steps=steps)
+
+
+def crude_monte_carlo(scenario, threshold, runs, seed=None):
+    """Estimate P(unhappy > threshold) with plain repeated runs.
+
+    scenario: dict with olin, wellesley, p1, p2 and num_steps
+    threshold: number of unhappy customers to exceed
+    runs: number of simulations
+    seed: seed for the random number generator
+
+    returns: dict, see `summarize`
+    """
+    rand = random.Random(seed).random
+    num_steps = scenario['num_steps']
+    hits = []
+    for i in range(runs):
+        values, final = bikeshare_kernel(
+            scenario['olin'], scenario['wellesley'], 0, 0,
+            scenario['p1'], scenario['p2'], num_steps, rand)
+        hits.append(1.0 if unhappy(final) > threshold else 0.0)
+    return summarize(hits, runs * num_steps)
+
+
+def tilted_run(scenario, q1, q2, rand):
+    """Run once with tilted arrival probabilities.
+
+    scenario: dict with olin, wellesley, p1, p2 and num_steps
+    q1, q2: probabilities used instead of p1 and p2
+    rand: function that returns uniform numbers in [0, 1)
+
+    returns: final (olin, wellesley, olin_empty, wellesley_empty), and
+             the number of Olin->Wellesley and Wellesley->Olin arrivals
+    """
+    num_steps = scenario['num_steps']
+    draws = [rand() for i in range(2 * num_steps)]
+    arrivals1 = sum(1 for u in draws[0::2] if u < q1)
+    arrivals2 = sum(1 for u in draws[1::2] if u < q2)
+    values, final = bikeshare_kernel(scenario['olin'],
+                                     scenario['wellesley'], 0, 0,
+                                     q1, q2, num_steps,
+                                     iter(draws).__next__)
+    return final, arrivals1, arrivals2
+
+
+def log_likelihood(q1, q2, num_steps, arrivals1, arrivals2):
+    """Log probability of a run's arrivals under the probabilities q1, q2.
+
+    The probability of a run depends only on its number of arrivals in
+    each direction, so this is all we need for likelihood ratios.
+    """
+    return (arrivals1 * log(q1) + (num_steps - arrivals1) * log(1 - q1) +
+            arrivals2 * log(q2) + (num_steps - arrivals2) * log(1 - q2))
+
+
+def importance_sampling(scenario, threshold, runs, tilts=None,
+                        defensive=0.1, seed=None):
+    """Estimate P(unhappy > threshold) by importance sampling.
+
+    Each run uses the original probabilities with probability
+    `defensive`, and otherwise one of the `tilts`, chosen uniformly. It
+    is weighted by p(run) / sum_k w_k q_k(run) over all components of
+    the mixture, which keeps the weights below 1 / defensive.
+
+    A single tilt is not enough in general: shortages happen either
+    when Olin runs out or when Wellesley does, and a tilt that makes
+    one common makes the other rarer still. The default tilts come from
+    `cross_entropy_tilt` for each station, and the steps it uses are
+    included in the count.
+
+    scenario: dict with olin, wellesley, p1, p2 and num_steps
+    threshold: number of unhappy customers to exceed
+    runs: number of simulations
+    tilts: list of (q1, q2) pairs
+    defensive: fraction of runs with the original probabilities
+    seed: seed for the random number generator
+
+    returns: dict, see `summarize`, with the tilts used
+    """
+    check_probabilities(scenario['p1'], scenario['p2'])
+    if tilts is not None:
+        for tilt in tilts:
+            check_probabilities(*tilt)
+    rng = random.Random(seed)
+    num_steps = scenario['num_steps']
+    steps = 0
+    if tilts is None:
+        tilts = []
+        for score in ['olin_empty', 'wellesley_empty']:
+            tilt, used = cross_entropy_tilt(scenario, threshold,
+                                            score=score, rng=rng,
+                                            return_steps=True)
+            tilts.append(tilt)
+            steps += used
+
+    original = scenario['p1'], scenario['p2']
+    components = [original] + list(tilts)
+    mixture = [defensive] + [(1 - defensive) / len(tilts)] * len(tilts)
+    log_mixture = [log(w) if w > 0 else float('-inf') for w in mixture]
+
+    weights = []
+    for i in range(runs):
+        q1, q2 = rng.choices(components, mixture)[0]
+        final, arrivals1, arrivals2 = tilted_run(scenario, q1, q2,
+                                                 rng.random)
+        if unhappy(final) <= threshold:
+            weights.append(0.0)
+            continue
+
+        # log of p(run) / sum_k w_k q_k(run), computed stably
+        logs = [lw + log_likelihood(c1, c2, num_steps, arrivals1,
+                                    arrivals2)
+                for lw, (c1, c2) in zip(log_mixture, components)]
+        top = max(logs)
+        log_q = top + log(sum(exp(x - top) for x in logs))
+        log_p = log_likelihood(*original, num_steps, arrivals1, arrivals2)
+        weights.append(exp(log_p - log_q))
+
+    report = summarize(weights, steps + runs * num_steps)
+    report['tilts'] = tilts
+    return report
+
+
+# functions that compute a score from the final state of a run
+SCORES = {
+    'unhappy': unhappy,
+    'olin_empty': lambda final: final[2],
+    'wellesley_empty': lambda final: final[3],
+}
+
+# functions of the number of arrivals in each direction that measure
+# how hard a run pushed toward each score, used to rank runs that tie
+DRIFTS = {
+    'unhappy': lambda arrivals1, arrivals2: abs(arrivals1 - arrivals2),
+    'olin_empty': lambda arrivals1, arrivals2: arrivals1 - arrivals2,
+    'wellesley_empty': lambda arrivals1, arrivals2: arrivals2 - arrivals1,
+}
+
+
+def check_probabilities(*probabilities):
+    """Check that arrival probabilities are strictly between 0 and 1.
+
+    The likelihood ratios take their logarithms, and a tilt can only
+    reweight runs that are possible under both probabilities.
+    """
+    for p in probabilities:
+        if not 0 < p < 1:
+            raise ValueError('Arrival probabilities should be strictly '
+                             'between 0 and 1, not %r' % p)
+
+
+def cross_entropy_tilt(scenario, threshold, score='unhappy', runs=1000,
+                       elite=0.1, iters=10, rng=None, return_steps=False):
+    """Choose tilted arrival probabilities with the cross-entropy method.
+
+    Each iteration runs the model with the current tilt, takes the
+    `elite` fraction of runs with the highest score (or all runs past
+    the threshold, once there are enough of them), and moves the tilt
+    to the likelihood-weighted arrival rates of those runs. If no run
+    scores at all, the elite runs are the ones that drifted furthest
+    toward the score, such as the most net departures from Olin for
+    'olin_empty'.
+
+    scenario: dict with olin, wellesley, p1, p2 and num_steps
+    threshold: the tilt targets runs whose score exceeds it
+    score: key in SCORES
+    runs: number of simulations per iteration
+    elite: fraction of runs used to update the tilt
+    iters: maximum number of iterations
+    rng: random.Random
+    return_steps: whether to also return the number of simulated steps
+
+    returns: tuple (q1, q2), and the number of steps if requested
+    """
+    check_probabilities(scenario['p1'], scenario['p2'])
+    rng = rng or random.Random()
+    score, drift = SCORES[score], DRIFTS[score]
+    num_steps = scenario['num_steps']
+    p1, p2 = scenario['p1'], scenario['p2']
+    q1, q2 = p1, p2
+    steps = 0
+
+    for i in range(iters):
+        samples = []
+        for j in range(runs):
+            final, arrivals1, arrivals2 = tilted_run(scenario, q1, q2,
+                                                     rng.random)
+            samples.append((score(final), arrivals1, arrivals2))
+        steps += runs * num_steps
+
+        scores = sorted(sample[0] for sample in samples)
+        level = min(max(scores[int((1 - elite) * runs)], 1), threshold + 1)
+        chosen = [sample for sample in samples if sample[0] >= level]
+        if not chosen:
+            samples.sort(key=lambda sample: (sample[0],
+                                             drift(sample[1], sample[2])),
+                         reverse=True)
+            chosen = samples[:max(1, int(elite * runs))]
+
+        # weighted maximum likelihood estimates of the arrival rates
+        weights = [exp(log_likelihood(p1, p2, num_steps, a1, a2) -
+                       log_likelihood(q1, q2, num_steps, a1, a2))
+                   for _, a1, a2 in chosen]
+        total = sum(weights) * num_steps
+        q1 = sum(w * s[1] for w, s in zip(weights, chosen)) / total
+        q2 = sum(w * s[2] for w, s in zip(weights, chosen)) / total
+
+        # keep both rates strictly inside (0, 1)
+        q1 = min(max(q1, 1e-3), 1 - 1e-3)
+        q2 = min(max(q2, 1e-3), 1 - 1e-3)
+        if level > threshold:
+            break
+
+    if return_steps:
+        return (q1, q2), steps
+    return q1, q2
+
+
+def run_until(state, t, p1, p2, num_steps, level, rand):
+    """Run one trajectory until the unhappy count reaches a level.
+
+    state: tuple (olin, wellesley, olin_empty, wellesley_empty)
+    t: current time step
+    p1, p2: arrival probabilities
+    num_steps: last time step
+    level: number of unhappy customers to reach
+    rand: function that returns uniform numbers in [0, 1)
+
+    returns: new state and time step; the level was reached if
+             `unhappy(state) >= level`
+    """
+    olin, wellesley, olin_empty, wellesley_empty = state
+    while t < num_steps and olin_empty + wellesley_empty < level:
+        if rand() < p1:
+            if olin == 0:
+                olin_empty += 1
+            else:
+                olin -= 1
+                wellesley += 1
+        if rand() < p2:
+            if wellesley == 0:
+                wellesley_empty += 1
+            else:
+                wellesley -= 1
+                olin += 1
+        t += 1
+    return (olin, wellesley, olin_empty, wellesley_empty), t
+
+
+def splitting_once(scenario, levels, runs, rng):
+    """Run fixed-effort multilevel splitting once.
+
+    Starts `runs` trajectories; at each level, the trajectories that
+    reached it are resampled, with replacement, back up to `runs`.
+
+    returns: estimate of the probability and number of simulated steps
+    """
+    p1, p2 = scenario['p1'], scenario['p2']
+    num_steps = scenario['num_steps']
+    start = (scenario['olin'], scenario['wellesley'], 0, 0)
+    particles = [(start, 0)] * runs
+    estimate = 1.0
+    steps = 0
+
+    for level in levels:
+        survivors = []
+        for state, t in particles:
+            new_state, new_t = run_until(state, t, p1, p2, num_steps,
+                                         level, rng.random)
+            steps += new_t - t
+            if unhappy(new_state) >= level:
+                survivors.append((new_state, new_t))
+
+        estimate *= len(survivors) / runs
+        if not survivors:
+            return 0.0, steps
+        particles = [rng.choice(survivors) for i in range(runs)]
+
+    return estimate, steps
+
+
+def splitting(scenario, threshold, runs=1000, levels=None, repeats=10,
+              seed=None):
+    """Estimate P(unhappy > threshold) by multilevel splitting.
+
+    The product of level fractions from one splitting run is an
+    unbiased estimate; the run is repeated independently `repeats`
+    times to estimate the standard error.
+
+    scenario: dict with olin, wellesley, p1, p2 and num_steps
+    threshold: number of unhappy customers to exceed
+    runs: number of trajectories kept at each level
+    levels: increasing unhappy counts ending with threshold + 1;
+            default is every fourth count
+    repeats: number of independent splitting runs
+    seed: seed for the random number generator
+
+    returns: dict, see `summarize`, with the levels used
+    """
+    if levels is None:
+        levels = list(range(4, threshold + 1, 4)) + [threshold + 1]
+    if levels[-1] != threshold + 1:
+        raise ValueError('The last level should be threshold + 1 = %d' %
+                         (threshold + 1))
+
+    rng = random.Random(seed)
+    estimates = []
+    steps = 0
+    for i in range(repeats):
+        estimate, used = splitting_once(scenario, levels, runs, rng)
+        estimates.append(estimate)
+        steps += used
+
+    report = summarize(estimates, steps)
+    report['levels'] = levels
+    return report
@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+"""Run-length compressed bikeshare trajectories.
+
+In most minutes of a bikeshare run, nobody rides, or one ride cancels
+the other, so the number of bikes at Olin does not change. Instead of
+one value per step, a `RunLengthTrajectory` stores only the change
+points, (time, new value), and the times at which the unhappy-customer
+counters went up. Memory use is proportional to the number of changes,
+so it drops by the inverse of the activity rate.
+
+    state = make_state()
+    olin = run_simulation(state, 0.3, 0.2, 60 * 24 * 365)
+    olin[1000]             # binary search over the change points
+    olin.time_at_zero()    # minutes without a bike at Olin
+    olin.to_timeseries()   # dense TimeSeries, same as bikeshare.py
+
+Given the same draws, `run_simulation` gives the same results as
+bikeshare.run_simulation.
+"""
+
+import random
+from array import array
+from bisect import bisect_right
+
+from . import core
+from .core import TimeSeries
+
+COUNTERS = ['olin_empty', 'wellesley_empty']
+
+
+class RunLengthTrajectory:
+    """Piecewise-constant trajectory stored as change points.
+
+    Time t has the value of the last change at or before t. Each
+    counter is stored as its initial value and the sorted times at
+    which it went up by one.
+    """
+
+    def __init__(self, length, times, values, counters=None):
+        """Make a trajectory from its change points.
+
+        length: number of time steps covered, including time 0
+        times: increasing change times, starting with 0
+        values: value from each change time to the next
+        counters: map from counter name to (initial value, times of
+                  increments)
+        """
+        if len(times) != len(values):
+            raise ValueError('times and values should have the same '
+                             'length')
+        if length > 0 and (not times or times[0] != 0):
+            raise ValueError('The first change point should be at time 0')
+        self.length = length
+        self.times = array('q', times)
+        self.values = array('q', values)
+        self.counters = {name: (initial, array('q', increments))
+                         for name, (initial, increments)
+                         in (counters or {}).items()}
+
+    @classmethod
+    def from_values(cls, values):
+        """Compress a dense sequence of values.
+
+        values: sequence of ints, such as a TimeSeries
+
+        returns: RunLengthTrajectory
+        """
+        recorder = RunLengthRecorder()
+        for t, value in enumerate(values):
+            recorder.record(t, value)
+        return recorder.finish(len(values))
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, t):
+        """Get the value at time t in O(log changes)."""
+        if t < 0:
+            t += self.length
+        if not 0 <= t < self.length:
+            raise IndexError('time %d out of range' % t)
+        return self.values[bisect_right(self.times, t) - 1]
+
+    def __repr__(self):
+        return '%s(length=%d, changes=%d)' % (
+            type(self).__name__, self.length, len(self.times))
+
+    def changes(self):
+        """Get the change points.
+
+        returns: list of (time, new value) pairs
+        """
+        return list(zip(self.times, self.values))
+
+    def run_lengths(self):
+        """Get the number of time steps covered by each change point.
+
+        returns: list of ints
+        """
+        ends = list(self.times[1:]) + [self.length]
+        return [end - start for start, end in zip(self.times, ends)]
+
+    def counter(self, name):
+        """Get the final value of a counter."""
+        initial, increments = self.counters[name]
+        return initial + len(increments)
+
+    def counter_at(self, name, t):
+        """Get the value of a counter at time t, in O(log increments)."""
+        initial, increments = self.counters[name]
+        return initial + bisect_right(increments, t)
+
+    def time_at(self, value):
+        """Count the time steps at which the trajectory has a value.
+
+        Same as `(self.to_timeseries() == value).sum()`, computed in
+        one pass over the change points.
+
+        returns: int
+        """
+        return sum(length for x, length in zip(self.values,
+                                               self.run_lengths())
+                   if x == value)
+
+    def time_at_zero(self):
+        """Count the time steps with no bikes, see `time_at`."""
+        return self.time_at(0)
+
+    def activity_rate(self):
+        """Fraction of time steps at which the value changed."""
+        if self.length < 2:
+            return 0.0
+        return (len(self.times) - 1) / (self.length - 1)
+
+    def nbytes(self):
+        """Number of bytes used by the change points and counters."""
+        total = (self.times.itemsize * len(self.times) +
+                 self.values.itemsize * len(self.values))
+        for initial, increments in self.counters.values():
+            total += increments.itemsize * len(increments)
+        return total
+
+    def to_timeseries(self):
+        """Expand to a dense TimeSeries with one value per time step.
+
+        returns: TimeSeries
+        """
+        np = core.np
+        values = np.repeat(np.asarray(self.values, dtype=np.int64),
+                           self.run_lengths())
+        return TimeSeries(values)
+
+
+class RunLengthRecorder:
+    """Build a RunLengthTrajectory one time step at a time."""
+
+    def __init__(self, counters=None):
+        """Make a recorder.
+
+        counters: map from counter name to initial value
+        """
+        self.times = array('q')
+        self.values = array('q')
+        self.increments = {name: (initial, array('q'))
+                           for name, initial in (counters or {}).items()}
+
+    def record(self, t, value):
+        """Record the value at time t, if it changed.
+
+        Times have to be recorded in increasing order.
+        """
+        values = self.values
+        if not values or values[-1] != value:
+            self.times.append(t)
+            values.append(value)
+
+    def increment(self, name, t):
+        """Record that a counter went up by one at time t."""
+        self.increments[name][1].append(t)
+
+    def finish(self, length):
+        """Make the trajectory.
+
+        length: number of time steps covered, including time 0
+
+        returns: RunLengthTrajectory
+        """
+        return RunLengthTrajectory(length, self.times, self.values,
+                                   self.increments)
+
+
+def run_simulation(state, p1, p2, num_steps, rand=None):
+    """Simulate the bikeshare model, recording only the changes.
+
+    Same interface as bikeshare.run_simulation: updates `state` and
+    returns the number of bikes at Olin, as a RunLengthTrajectory that
+    also records when each unhappy-customer counter went up.
+
+    state: State object
+    p1: probability of an Olin->Wellesley customer arrival
+    p2: probability of a Wellesley->Olin customer arrival
+    num_steps: number of time steps
+    rand: function that returns uniform numbers, default is
+          random.random
+
+    returns: RunLengthTrajectory
+    """
+    if rand is None:
+        rand = random.random
+    olin, wellesley = state.olin, state.wellesley
+    olin_empty, wellesley_empty = state.olin_empty, state.wellesley_empty
+
+    times = array('q', [0])
+    values = array('q', [olin])
+    olin_increments = array('q')
+    wellesley_increments = array('q')
+    last = olin
+
+    for t in range(1, num_steps + 1):
+        if rand() < p1:
+            if olin == 0:
+                olin_empty += 1
+                olin_increments.append(t)
+            else:
+                olin -= 1
+                wellesley += 1
+        if rand() < p2:
+            if wellesley == 0:
+                wellesley_empty += 1
+                wellesley_increments.append(t)
+            else:
+                wellesley -= 1
+                olin += 1
+        if olin != last:
+            times.append(t)
+            values.append(olin)
+            last = olin
+
+    counters = dict(olin_empty=(state.olin_empty, olin_increments),
+                    wellesley_empty=(state.wellesley_empty,
+                                     wellesley_increments))
+    state.olin, state.wellesley = olin, wellesley
+    state.olin_empty, state.wellesley_empty = olin_empty, wellesley_empty
+    return RunLengthTrajectory(num_steps + 1, times, values, counters)
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""Sensitivity of the growth models to their parameters.
+
+To see how the population depends on `alpha` or `birth_rate`, we could
+perturb each parameter and run the model again, which takes N+1
+simulations for N parameters and gives only approximate derivatives.
+This module uses forward-mode automatic differentiation instead: each
+parameter is replaced by a dual number that carries its value and its
+derivative with respect to every parameter, and the arithmetic in the
+growth function propagates both. One run gives the trajectory and the
+exact year-by-parameter Jacobian.
+
+    values, jacobian = sensitivities(system, growth_func2)
+    jacobian.loc[2016, 'alpha']     # d pop(2016) / d alpha
+
+Growth functions need no changes, as long as they only do arithmetic
+and comparisons with the parameters.
+"""
+
+from numbers import Integral, Real
+
+from . import core
+from .core import TimeSeries, growth_kernel
+from .growth import bind_growth_func
+from .incremental import with_changes
+
+
+class Dual:
+    """Number with a vector of partial derivatives (tangents).
+
+    value: the number
+    tangent: tuple of partial derivatives, one per parameter
+    """
+    __slots__ = ('value', 'tangent')
+
+    def __init__(self, value, tangent):
+        self.value = value
+        self.tangent = tangent
+
+    def __repr__(self):
+        return 'Dual(%r, %r)' % (self.value, self.tangent)
+
+    def __float__(self):
+        return float(self.value)
+
+    def __add__(self, other):
+        if isinstance(other, Dual):
+            return Dual(self.value + other.value,
+                        tuple(a + b for a, b in zip(self.tangent,
+                                                    other.tangent)))
+        return Dual(self.value + other, self.tangent)
+
+    __radd__ = __add__
+
+    def __neg__(self):
+        return Dual(-self.value, tuple(-a for a in self.tangent))
+
+    def __pos__(self):
+        return self
+
+    def __sub__(self, other):
+        return self + (-other)
+
+    def __rsub__(self, other):
+        return (-self) + other
+
+    def __mul__(self, other):
+        if isinstance(other, Dual):
+            u, v = self.value, other.value
+            return Dual(u * v,
+                        tuple(a * v + u * b for a, b in zip(self.tangent,
+                                                            other.tangent)))
+        return Dual(self.value * other, tuple(a * other
+                                              for a in self.tangent))
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other):
+        if isinstance(other, Dual):
+            return self * other.reciprocal()
+        return Dual(self.value / other, tuple(a / other
+                                              for a in self.tangent))
+
+    def __rtruediv__(self, other):
+        return self.reciprocal() * other
+
+    def reciprocal(self):
+        """Compute 1 / self."""
+        scale = -1 / self.value**2
+        return Dual(1 / self.value, tuple(a * scale for a in self.tangent))
+
+    def __pow__(self, exponent):
+        if isinstance(exponent, Dual):
+            raise TypeError('Dual exponents are not supported')
+        scale = exponent * self.value**(exponent - 1)
+        return Dual(self.value**exponent,
+                    tuple(a * scale for a in self.tangent))
+
+    def __abs__(self):
+        return -self if self.value < 0 else self
+
+    # comparisons use the value, so branches follow the primal run
+    def __eq__(self, other):
+        return self.value == value_of(other)
+
+    def __lt__(self, other):
+        return self.value < value_of(other)
+
+    def __le__(self, other):
+        return self.value <= value_of(other)
+
+    def __gt__(self, other):
+        return self.value > value_of(other)
+
+    def __ge__(self, other):
+        return self.value >= value_of(other)
+
+    __hash__ = None
+
+
+def value_of(x):
+    """Get the value of a Dual, or return a plain number unchanged."""
+    return x.value if isinstance(x, Dual) else x
+
+
+def tangent_of(x, n):
+    """Get the tangent of a Dual; a plain number has a zero tangent."""
+    return x.tangent if isinstance(x, Dual) else (0.0,) * n
+
+
+def seed_params(system, params):
+    """Replace parameters with duals that have unit tangents.
+
+    system: System object
+    params: names of the parameters to differentiate with respect to
+
+    returns: copy of the System
+    """
+    n = len(params)
+    changes = {}
+    for i, name in enumerate(params):
+        tangent = tuple(1.0 if j == i else 0.0 for j in range(n))
+        changes[name] = Dual(getattr(system, name), tangent)
+    return with_changes(system, **changes)
+
+
+def default_params(system):
+    """Get the names of the real-valued parameters of a System.
+
+    Integer fields, such as t_0 and t_end, are not differentiable,
+    including NumPy integers like the years taken from a Series index.
+    """
+    items = (system.items() if hasattr(system, 'items')
+             else vars(system).items())
+    return [name for name, value in items
+            if isinstance(value, Real) and not isinstance(value, Integral)]
+
+
+def jacobian(system, simulate, params=None):
+    """Run a simulation with duals and collect the derivatives.
+
+    system: System object
+    simulate: function that takes a System and returns a sequence or
+              Series of populations, one per year
+    params: names of the parameters; default is every real-valued,
+            non-integer field of the System
+
+    returns: TimeSeries of populations, and a DataFrame with one row per
+             year and one column per parameter
+    """
+    if params is None:
+        params = default_params(system)
+    params = list(params)
+    n = len(params)
+
+    results = simulate(seed_params(system, params))
+    if hasattr(results, 'iloc'):
+        index = results.index
+        results = list(results)
+    else:
+        index = range(system.t_0, system.t_0 + len(results))
+
+    values = TimeSeries([float(value_of(x)) for x in results], index=index)
+    table = core.pd.DataFrame([tangent_of(x, n) for x in results],
+                              index=values.index, columns=params)
+    table.columns.name = 'Parameter'
+    return values, table
+
+
+def sensitivities(system, growth_func, params=None):
+    """Compute a growth trajectory and its derivatives in one pass.
+
+    Same model as growth.run_simulation(system, growth_func).
+
+    system: System object with t_0, t_end, p_0 and the model parameters
+    growth_func: function with signature growth_func(t, pop, system)
+    params: names of the parameters; default is every real-valued,
+            non-integer field of the System
+
+    returns: TimeSeries of populations, and a DataFrame with the
+             derivative of the population in each year (rows) with
+             respect to each parameter (columns)
+    """
+    def simulate(system):
+        growth = bind_growth_func(growth_func, system)
+        return growth_kernel(system.t_0, system.t_end, system.p_0, growth)
+    return jacobian(system, simulate, params)
+
+
+def elasticities(values, derivatives, system):
+    """Convert derivatives to elasticities, d log(pop) / d log(param).
+
+    An elasticity of 2 means that a 1% increase in the parameter
+    increases the population by about 2%.
+
+    values: TimeSeries returned by `sensitivities`
+    derivatives: DataFrame returned by `sensitivities`
+    system: System object with the parameter values
+
+    returns: DataFrame like `derivatives`
+    """
+    scale = [getattr(system, name) for name in derivatives.columns]
+    return derivatives.mul(scale, axis=1).div(values, axis=0)
@@ -0,0 +1,450 @@
+# -*- coding: utf-8 -*-
+"""Local asyncio service that evaluates scenarios in micro-batches.
+
+Dashboards ask for many small evaluations at once, such as one `alpha`
+value or one (p1, p2) pair. Evaluating each one separately pays the
+Python overhead per request. `SimulationService` collects the requests
+that arrive within `window` seconds (up to `max_batch` of them),
+evaluates each model's requests together as one array computation in a
+worker pool, off the event loop, and resolves each caller's future with
+its own result.
+
+    service = SimulationService(window=0.005)
+    await service.start()
+    values = await service.submit('growth2',
+                                  dict(t_0=1950, t_end=2016,
+                                       p_0=2.557, alpha=0.0173))
+    await service.stop()
+
+`serve` exposes a service over TCP with one JSON object per line, so it
+can be tested entirely on localhost:
+
+    {"id": 1, "model": "bikeshare",
+     "params": {"p1": 0.3, "p2": 0.2, "num_steps": 60, "seed": 7}}
+
+    python -m modsim_models.service --port 8765
+
+The models are listed in EVALUATORS. Growth results match
+growth.run_simulation. Bikeshare requests are seeded one by one, so
+their results do not depend on which batch they land in.
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter_ns
+
+import numpy as np
+
+from .profiling import Histogram
+from .vectorized import scan_positions
+
+# functions that compute next year's population for a batch of
+# scenarios, in the same order of operations as growth.py
+GROWTH_UPDATES = {
+    'constant': lambda t, pop, p: pop + p['annual_growth'],
+    'proportional': lambda t, pop, p: (pop + p['birth_rate'] * pop -
+                                       p['death_rate'] * pop),
+    'growth1': lambda t, pop, p: pop + (p['birth_rate'] * pop -
+                                        p['death_rate'] * pop),
+    'growth2': lambda t, pop, p: pop + p['alpha'] * pop,
+    'growth3': lambda t, pop, p: pop + np.where(t < 1980, p['alpha1'],
+                                                p['alpha2']) * pop,
+}
+
+
+def evaluate_growth(model, batch):
+    """Run a batch of growth scenarios together.
+
+    Scenarios with the same t_0 advance in lockstep, one array operation
+    per year; each result is cut at its own t_end.
+
+    model: key in GROWTH_UPDATES
+    batch: list of dicts with t_0, t_end, p_0 and the model's rates
+
+    returns: list of lists of populations from t_0 to t_end
+    """
+    update = GROWTH_UPDATES[model]
+    results = [None] * len(batch)
+
+    groups = {}
+    for i, params in enumerate(batch):
+        if params['t_end'] < params['t_0']:
+            raise ValueError('t_end (%s) is before t_0 (%s)' %
+                             (params['t_end'], params['t_0']))
+        groups.setdefault(params['t_0'], []).append(i)
+
+    for t_0, indices in groups.items():
+        ends = [batch[i]['t_end'] for i in indices]
+        columns = {}
+        for name in batch[indices[0]]:
+            if name not in ('t_0', 't_end'):
+                columns[name] = np.array([batch[i][name] for i in indices],
+                                         dtype=float)
+
+        pop = columns['p_0']
+        rows = [pop]
+        for t in range(t_0, max(ends)):
+            pop = update(t, pop, columns)
+            rows.append(pop)
+        table = np.array(rows)
+
+        for column, (i, t_end) in enumerate(zip(indices, ends)):
+            results[i] = table[:t_end - t_0 + 1, column].tolist()
+    return results
+
+
+def evaluate_bikeshare(batch):
+    """Run a batch of bikeshare scenarios as one clamped prefix scan.
+
+    Each scenario becomes a run of clamp functions, as in vectorized.py,
+    preceded by a function that resets the position to its initial
+    number of bikes at Olin, so one scan covers the whole batch.
+
+    batch: list of dicts with p1, p2, num_steps and optionally olin,
+           wellesley and seed
+
+    returns: list of dicts with the number of bikes at Olin after each
+             step (starting with the initial value), olin_empty and
+             wellesley_empty
+    """
+    moves, lows, highs, starts = [], [], [], []
+    offset = 0
+    for params in batch:
+        olin = params.get('olin', 10)
+        total = olin + params.get('wellesley', 2)
+        num_steps = params['num_steps']
+        draws = np.random.default_rng(params.get('seed')).random(
+            (num_steps, 2))
+
+        move = np.empty(2 * num_steps + 1, dtype=np.int64)
+        move[0] = 0
+        move[1::2] = -(draws[:, 0] < params['p1']).astype(np.int64)
+        move[2::2] = draws[:, 1] < params['p2']
+        low = np.zeros_like(move)
+        high = np.full_like(move, total)
+        low[0] = high[0] = olin
+
+        moves.append(move)
+        lows.append(low)
+        highs.append(high)
+        starts.append(offset)
+        offset += len(move)
+
+    if not batch:
+        return []
+    move = np.concatenate(moves)
+    positions = scan_positions(0, (move, np.concatenate(lows),
+                                   np.concatenate(highs)))
+    before = np.empty_like(positions)
+    before[0] = 0
+    before[1:] = positions[:-1]
+    blocked = (move != 0) & (positions == before)
+
+    results = []
+    for start, params in zip(starts, batch):
+        stop = start + 2 * params['num_steps'] + 1
+        segment = blocked[start + 1:stop]
+        results.append(dict(
+            values=positions[start:stop:2].tolist(),
+            olin_empty=int(np.count_nonzero(segment[0::2])),
+            wellesley_empty=int(np.count_nonzero(segment[1::2]))))
+    return results
+
+
+def evaluate(model, batch):
+    """Evaluate a batch of requests for one model; runs in a worker.
+
+    model: key in EVALUATORS
+    batch: list of parameter dicts
+
+    returns: list of results, in the same order
+    """
+    if model == 'bikeshare':
+        return evaluate_bikeshare(batch)
+    return evaluate_growth(model, batch)
+
+
+EVALUATORS = ['bikeshare'] + sorted(GROWTH_UPDATES)
+
+
+class SimulationService:
+    """Collect requests into micro-batches and evaluate them in a pool."""
+
+    def __init__(self, window=0.005, max_batch=256, executor=None):
+        """Make a service; call `start` from a running event loop.
+
+        window: how long to wait for more requests after the first
+                request of a batch, in seconds
+        max_batch: largest number of requests in a batch
+        executor: concurrent.futures executor; default is a pool of
+                  spawned processes, one per CPU, shut down by `stop`
+        """
+        self.window = window
+        self.max_batch = max_batch
+        self.executor = executor
+        self.owns_executor = executor is None
+        self.queue = None
+        self.collector = None
+        self.running = set()
+        self.stopping = False
+
+        self.latency = Histogram()
+        self.batch_sizes = Histogram()
+        self.requests = 0
+        self.batches = 0
+        self.errors = 0
+        self.max_queue_depth = 0
+        self.total_queue_depth = 0
+
+    async def start(self):
+        """Start collecting requests."""
+        if self.executor is None:
+            # forked workers would inherit the sockets of open client
+            # connections and keep them open after the server closes them
+            self.executor = ProcessPoolExecutor(
+                os.cpu_count() or 1,
+                mp_context=multiprocessing.get_context('spawn'))
+        self.queue = asyncio.Queue()
+        self.stopping = False
+        self.collector = asyncio.ensure_future(self.collect())
+
+    async def stop(self):
+        """Finish the batches in progress and stop the service.
+
+        Requests that were already submitted are evaluated; new ones
+        raise RuntimeError.
+        """
+        self.stopping = True
+        self.collector.cancel()
+        try:
+            await self.collector
+        except asyncio.CancelledError:
+            pass
+        if self.running:
+            await asyncio.wait(self.running)
+        if self.owns_executor:
+            self.executor.shutdown()
+            self.executor = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+    async def submit(self, model, params):
+        """Evaluate one scenario.
+
+        model: key in EVALUATORS
+        params: dict of parameters
+
+        returns: result of the model for these parameters
+        """
+        if model not in EVALUATORS:
+            raise ValueError('model should be one of %s, not %r' %
+                             (', '.join(EVALUATORS), model))
+        if self.queue is None or self.stopping:
+            raise RuntimeError('The service is not running')
+        start = perf_counter_ns()
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((model, params, future))
+
+        depth = self.queue.qsize()
+        self.max_queue_depth = max(self.max_queue_depth, depth)
+        self.total_queue_depth += depth
+        self.requests += 1
+        try:
+            return await future
+        finally:
+            self.latency.add(perf_counter_ns() - start)
+
+    async def collect(self):
+        """Group queued requests into batches and dispatch them.
+
+        When cancelled by `stop`, dispatches the batch it was collecting
+        and every request still in the queue before finishing.
+        """
+        loop = asyncio.get_running_loop()
+        queue = self.queue
+        batch = []
+        try:
+            while True:
+                batch = [await queue.get()]
+                deadline = loop.time() + self.window
+                while len(batch) < self.max_batch:
+                    if not queue.empty():
+                        batch.append(queue.get_nowait())
+                        continue
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(queue.get(),
+                                                            remaining))
+                    except asyncio.TimeoutError:
+                        break
+                self.dispatch_batch(batch)
+                batch = []
+        except asyncio.CancelledError:
+            while not queue.empty():
+                batch.append(queue.get_nowait())
+            for start in range(0, len(batch), self.max_batch):
+                self.dispatch_batch(batch[start:start + self.max_batch])
+            raise
+
+    def dispatch_batch(self, batch):
+        """Start evaluating a batch, one task per model."""
+        self.batches += 1
+        self.batch_sizes.add(len(batch))
+        groups = {}
+        for model, params, future in batch:
+            groups.setdefault(model, []).append((params, future))
+        for model, items in groups.items():
+            task = asyncio.ensure_future(self.dispatch(model, items))
+            self.running.add(task)
+            task.add_done_callback(self.running.discard)
+
+    async def dispatch(self, model, items):
+        """Evaluate one model's share of a batch in the executor."""
+        loop = asyncio.get_running_loop()
+        batch = [params for params, future in items]
+        try:
+            results = await loop.run_in_executor(self.executor, evaluate,
+                                                 model, batch)
+        except Exception as exc:
+            if len(items) == 1:
+                self.errors += 1
+                if not items[0][1].done():
+                    items[0][1].set_exception(exc)
+                return
+            # evaluate the requests one by one, so one bad request does
+            # not fail the others
+            await asyncio.gather(*[self.dispatch(model, [item])
+                                   for item in items])
+            return
+        for (params, future), result in zip(items, results):
+            if not future.done():
+                future.set_result(result)
+
+    def metrics(self):
+        """Summarize latency, batching and queue depth.
+
+        returns: dict; latencies are in nanoseconds, and `batch_size`
+                 buckets are powers of two
+        """
+        mean_depth = (self.total_queue_depth / self.requests
+                      if self.requests else 0)
+        return dict(requests=self.requests,
+                    batches=self.batches,
+                    errors=self.errors,
+                    queue_depth=self.queue.qsize() if self.queue else 0,
+                    max_queue_depth=self.max_queue_depth,
+                    mean_queue_depth=mean_depth,
+                    latency=self.latency.report(),
+                    batch_size=self.batch_sizes.report())
+
+
+async def handle_connection(service, reader, writer):
+    """Answer the JSON-lines requests from one client.
+
+    Requests on one connection are evaluated concurrently, and each
+    response carries the `id` of its request. A request with
+    `"metrics": true` gets the service metrics.
+    """
+    lock = asyncio.Lock()
+    pending = set()
+
+    async def respond(message):
+        response = dict(id=message.get('id'))
+        try:
+            if message.get('metrics'):
+                response['metrics'] = service.metrics()
+            else:
+                response['result'] = await service.submit(
+                    message['model'], message.get('params', {}))
+        except Exception as exc:
+            response['error'] = '%s: %s' % (type(exc).__name__, exc)
+        async with lock:
+            writer.write(json.dumps(response).encode() + b'\n')
+            await writer.drain()
+
+    try:
+        async for line in reader:
+            if not line.strip():
+                continue
+            task = asyncio.ensure_future(respond(json.loads(line)))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+        if pending:
+            await asyncio.wait(pending)
+    finally:
+        writer.close()
+
+
+async def serve(service, host='127.0.0.1', port=0):
+    """Serve a started SimulationService over TCP.
+
+    host: address to listen on; the default accepts only local clients
+    port: port number, or 0 to pick a free one
+
+    returns: asyncio Server; its port is
+             `server.sockets[0].getsockname()[1]`
+    """
+    def handler(reader, writer):
+        return handle_connection(service, reader, writer)
+    return await asyncio.start_server(handler, host, port)
+
+
+async def request(host, port, messages):
+    """Send requests to a running service and wait for the responses.
+
+    host, port: address of the service
+    messages: list of request dicts, each with a unique `id`
+
+    returns: list of responses, in the same order as the messages
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for message in messages:
+            writer.write(json.dumps(message).encode() + b'\n')
+        await writer.drain()
+        responses = {}
+        while len(responses) < len(messages):
+            response = json.loads(await reader.readline())
+            responses[response['id']] = response
+    finally:
+        writer.close()
+        await writer.wait_closed()
+    return [responses[message['id']] for message in messages]
+
+
+async def run_server(host, port, window, max_batch):
+    async with SimulationService(window, max_batch) as service:
+        server = await serve(service, host, port)
+        print('Listening on %s:%d' % server.sockets[0].getsockname()[:2])
+        async with server:
+            await server.serve_forever()
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--window', type=float, default=0.005,
+                        help='batching window in seconds')
+    parser.add_argument('--max-batch', type=int, default=256)
+    args = parser.parse_args(args)
+    try:
+        asyncio.run(run_server(args.host, args.port, args.window,
+                               args.max_batch))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
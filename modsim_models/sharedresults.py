@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""Collect process-parallel bikeshare results in shared memory.
+
+When bikeshare replicas run in separate processes, returning each
+trajectory to the parent means pickling it in the worker and unpickling
+it in the parent. Here the parent allocates one shared-memory block
+with room for every replica, the workers write `olin`, `wellesley`,
+`olin_empty` and `wellesley_empty` straight into their rows, and the
+parent reads the block as NumPy arrays, without copying.
+
+    with run_replicas(10, 2, 0.3, 0.2, 60, replicas=10000) as results:
+        print(results.olin_empty.mean())
+"""
+
+import os
+import random
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .core import bikeshare_kernel
+
+DTYPE = np.dtype(np.int64)
+
+# shared block attached by each worker process, set by init_worker
+worker_results = None
+
+
+class SharedResults:
+    """Bikeshare results for many replicas in one shared-memory block.
+
+    Use `create` in the parent and `attach` in the workers rather than
+    calling the constructor.
+
+    shm: SharedMemory object
+    replicas: number of replicas
+    num_steps: number of time steps per replica
+    owner: True if this process created the block and should unlink it
+    """
+
+    def __init__(self, shm, replicas, num_steps, owner=False):
+        self.shm = shm
+        self.replicas = replicas
+        self.num_steps = num_steps
+        self.owner = owner
+
+        shape = replicas, num_steps + 1
+        size = replicas * (num_steps + 1) * DTYPE.itemsize
+        buffer = shm.buf
+        self.olin = np.ndarray(shape, DTYPE, buffer, offset=0)
+        self.wellesley = np.ndarray(shape, DTYPE, buffer, offset=size)
+        self.olin_empty = np.ndarray(replicas, DTYPE, buffer,
+                                     offset=2 * size)
+        self.wellesley_empty = np.ndarray(
+            replicas, DTYPE, buffer,
+            offset=2 * size + replicas * DTYPE.itemsize)
+
+    @staticmethod
+    def nbytes(replicas, num_steps):
+        """Size of the block for the given number of replicas and steps."""
+        return 2 * replicas * (num_steps + 2) * DTYPE.itemsize
+
+    @classmethod
+    def create(cls, replicas, num_steps):
+        """Allocate a new block, initialized to zero.
+
+        returns: SharedResults that owns the block
+        """
+        size = cls.nbytes(replicas, num_steps)
+        shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        results = cls(shm, replicas, num_steps, owner=True)
+        results.olin_empty[:] = 0
+        results.wellesley_empty[:] = 0
+        return results
+
+    @classmethod
+    def attach(cls, spec):
+        """Attach to a block created by another process.
+
+        spec: tuple returned by the creator's `spec` attribute
+
+        returns: SharedResults
+        """
+        name, replicas, num_steps = spec
+        if sys.version_info >= (3, 13):
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        else:
+            shm = shared_memory.SharedMemory(name=name)
+        return cls(shm, replicas, num_steps)
+
+    @property
+    def spec(self):
+        """Small, picklable description used to attach in a worker."""
+        return self.shm.name, self.replicas, self.num_steps
+
+    def close(self):
+        """Release the views and detach; the owner also frees the block."""
+        self.olin = self.wellesley = None
+        self.olin_empty = self.wellesley_empty = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def init_worker(spec):
+    """Attach the shared block once per worker process."""
+    global worker_results
+    worker_results = SharedResults.attach(spec)
+
+
+def run_replicas_into(start, stop, olin, wellesley, p1, p2, seed):
+    """Run replicas `start` to `stop - 1` and write them to the block.
+
+    Runs in a worker process after init_worker.
+
+    olin, wellesley: initial number of bikes at each station
+    p1: probability of an Olin->Wellesley ride
+    p2: probability of a Wellesley->Olin ride
+    seed: base seed; replica i is seeded with '<seed>-<i>', as in cli.py
+    """
+    results = worker_results
+    total = olin + wellesley
+    for index in range(start, stop):
+        random.seed('%s-%d' % (seed, index))
+        values, final = bikeshare_kernel(olin, wellesley, 0, 0,
+                                         p1, p2, results.num_steps)
+        row = results.olin[index]
+        row[:] = values
+        np.subtract(total, row, out=results.wellesley[index])
+        results.olin_empty[index] = final[2]
+        results.wellesley_empty[index] = final[3]
+
+
+def run_replicas(olin, wellesley, p1, p2, num_steps, replicas,
+                 workers=None, chunk_size=None, seed=0):
+    """Run bikeshare replicas in parallel into shared memory.
+
+    olin, wellesley: initial number of bikes at each station
+    p1: probability of an Olin->Wellesley ride
+    p2: probability of a Wellesley->Olin ride
+    num_steps: number of time steps per replica
+    replicas: number of replicas
+    workers: number of worker processes, default is the number of CPUs
+    chunk_size: number of replicas per task
+    seed: base seed for the replicas
+
+    returns: SharedResults; the caller should close it when done
+    """
+    workers = workers or os.cpu_count() or 1
+    if chunk_size is None:
+        chunk_size = max(1, replicas // (8 * workers))
+
+    results = SharedResults.create(replicas, num_steps)
+    try:
+        with ProcessPoolExecutor(workers, initializer=init_worker,
+                                 initargs=(results.spec,)) as executor:
+            futures = [executor.submit(run_replicas_into, start,
+                                       min(start + chunk_size, replicas),
+                                       olin, wellesley, p1, p2, seed)
+                       for start in range(0, replicas, chunk_size)]
+            for future in futures:
+                future.result()
+    except BaseException:
+        results.close()
+        raise
+    return results
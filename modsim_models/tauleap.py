@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""Coarse-step (tau-leaping) bikeshare simulation for long horizons.
+
+Stepping minute by minute is wasteful when we only care about daily
+totals over months. `run_tau_leap` advances the model in blocks of `k`
+minutes: the number of rides in each direction during a block is
+Binomial(k, p), and the number of bikes at Olin changes by their
+difference.
+
+That is exact as long as neither station runs out of bikes during the
+block. The error-control rule is: leap only if each station has at
+least the expected number of departures in the block plus `safety`
+standard deviations, so that an empty station during a leap is a tail
+event. Close to empty, the leap is shortened, and when even a short
+leap is unsafe, the model is stepped exactly, minute by minute. If a
+leap does overshoot, the station is clipped at empty and the overshoot
+is counted as unhappy customers, which is an approximation.
+
+`compare_with_exact` measures the accuracy of the daily totals against
+the exact engine.
+"""
+
+from math import ceil, sqrt
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+from .core import bikeshare_kernel
+from .vectorized import bikeshare_path
+
+MINUTES_PER_DAY = 24 * 60
+
+
+def leap_threshold(k, p, safety):
+    """Minimum number of bikes needed to leap `k` minutes.
+
+    k: block length in minutes
+    p: probability of a departure each minute
+    safety: number of standard deviations of margin
+
+    returns: int
+    """
+    return min(k, ceil(k * p + safety * sqrt(k * p * (1 - p))))
+
+
+def run_tau_leap(olin, wellesley, p1, p2, num_days, k=60, safety=3.0,
+                 min_leap=4, rng=None):
+    """Simulate the bikeshare model in blocks of up to `k` minutes.
+
+    When a station has too few bikes to leap `k` minutes, the leap is
+    halved until it is safe; below `min_leap` minutes, the model is
+    stepped exactly for `min_leap` minutes instead.
+
+    olin, wellesley: initial number of bikes at each station
+    p1: probability of an Olin->Wellesley ride each minute
+    p2: probability of a Wellesley->Olin ride each minute
+    num_days: number of days to simulate
+    k: longest leap in minutes
+    safety: margin of the error-control rule, in standard deviations
+    min_leap: shortest leap in minutes
+    rng: NumPy Generator
+
+    returns: DataFrame indexed by day, with the number of bikes at Olin
+             at the end of the day and the unhappy customers during the
+             day; its `attrs` record the number of leaps and the number
+             of minutes stepped exactly
+    """
+    rng = rng or np.random.default_rng()
+    binomial, uniform = rng.binomial, rng.random
+    total = olin + wellesley
+
+    # leap sizes to try, longest first, with their thresholds
+    sizes = []
+    tau = k
+    while tau >= min_leap:
+        sizes.append((tau, leap_threshold(tau, p1, safety),
+                      leap_threshold(tau, p2, safety)))
+        tau //= 2
+
+    days = np.zeros((num_days, 3), dtype=np.int64)
+    leaps = exact_minutes = 0
+    olin_empty = wellesley_empty = 0
+
+    for day in range(num_days):
+        remaining = MINUTES_PER_DAY
+        while remaining > 0:
+            wellesley = total - olin
+            for tau, threshold1, threshold2 in sizes:
+                if (tau <= remaining and olin >= threshold1 and
+                        wellesley >= threshold2):
+                    break
+            else:
+                tau = None
+
+            if tau is not None:
+                olin += int(binomial(tau, p2)) - int(binomial(tau, p1))
+                if olin < 0:
+                    olin_empty -= olin
+                    olin = 0
+                elif olin > total:
+                    wellesley_empty += olin - total
+                    olin = total
+                leaps += 1
+            else:
+                tau = min(min_leap, remaining)
+                draws = uniform(2 * tau).tolist()
+                values, final = bikeshare_kernel(
+                    olin, wellesley, olin_empty, wellesley_empty,
+                    p1, p2, tau, iter(draws).__next__)
+                olin, wellesley, olin_empty, wellesley_empty = final
+                exact_minutes += tau
+            remaining -= tau
+
+        days[day] = olin, olin_empty, wellesley_empty
+        olin_empty = wellesley_empty = 0
+
+    table = pd.DataFrame(days, columns=['olin', 'olin_empty',
+                                        'wellesley_empty'],
+                         index=pd.RangeIndex(num_days, name='Day'))
+    table.attrs.update(leaps=leaps, exact_minutes=exact_minutes)
+    return table
+
+
+def run_exact(olin, wellesley, p1, p2, num_days, rng=None):
+    """Simulate minute by minute and summarize by day.
+
+    Same output as run_tau_leap, using the vectorized exact kernel.
+
+    returns: DataFrame indexed by day
+    """
+    rng = rng or np.random.default_rng()
+    days = np.zeros((num_days, 3), dtype=np.int64)
+    for day in range(num_days):
+        values, olin_empty, wellesley_empty = bikeshare_path(
+            olin, wellesley, p1, p2, MINUTES_PER_DAY, rng=rng)
+        total = olin + wellesley
+        olin = int(values[-1])
+        wellesley = total - olin
+        days[day] = olin, olin_empty, wellesley_empty
+
+    return pd.DataFrame(days, columns=['olin', 'olin_empty',
+                                       'wellesley_empty'],
+                        index=pd.RangeIndex(num_days, name='Day'))
+
+
+def compare_with_exact(olin, wellesley, p1, p2, num_days, k=60,
+                       safety=3.0, min_leap=4, replicas=20, seed=None):
+    """Compare daily totals from tau-leaping with the exact engine.
+
+    Runs both engines `replicas` times and compares the mean and
+    standard deviation of the daily unhappy-customer counts and of the
+    number of bikes at Olin at the end of each day.
+
+    returns: DataFrame with one row per quantity, and the mean run
+             time of each engine in its `attrs`
+    """
+    rng = np.random.default_rng(seed)
+    runs = dict(tau_leap=[], exact=[])
+    times = dict(tau_leap=0.0, exact=0.0)
+
+    for i in range(replicas):
+        start = perf_counter()
+        runs['tau_leap'].append(run_tau_leap(olin, wellesley, p1, p2,
+                                             num_days, k, safety,
+                                             min_leap, rng))
+        times['tau_leap'] += perf_counter() - start
+
+        start = perf_counter()
+        runs['exact'].append(run_exact(olin, wellesley, p1, p2,
+                                       num_days, rng))
+        times['exact'] += perf_counter() - start
+
+    rows = {}
+    for column in ['olin', 'olin_empty', 'wellesley_empty']:
+        row = {}
+        for engine, tables in runs.items():
+            values = np.concatenate([table[column].values
+                                     for table in tables])
+            row[engine + '_mean'] = values.mean()
+            row[engine + '_std'] = values.std()
+        row['difference'] = row['tau_leap_mean'] - row['exact_mean']
+        rows[column] = row
+
+    table = pd.DataFrame(rows).T
+    table.attrs.update(tau_leap_seconds=times['tau_leap'] / replicas,
+                       exact_seconds=times['exact'] / replicas)
+    return table
@@ -0,0 +1,303 @@
+# -*- coding: utf-8 -*-
+"""Append-only binary store for large sets of trajectories.
+
+Sweeps and ensembles produce millions of trajectories, such as the
+number of bikes at Olin or the world population, and pickling one
+TimeSeries per run does not scale. A trajectory store holds one chunk
+per scenario: a small header with the scenario name, the System or
+State parameters, the start time and the dtype, followed by a 2-D
+array with one row per trajectory and one column per time step.
+
+Writers stream rows into the current chunk; readers memory-map the
+file, so slicing a scenario or a range of times reads only that part.
+
+    with TrajectoryWriter('runs.traj') as writer:
+        writer.begin('base', num_steps=61, params=bikeshare)
+        for i in range(1000):
+            writer.write(run_simulation(make_state(), 0.3, 0.2, 60))
+        writer.end()
+
+    store = TrajectoryStore('runs.traj')
+    olin = store.read('base', times=slice(0, 30))
+
+File layout: an 8-byte magic number, then chunks. Each chunk starts
+with b'CHNK', the length of its JSON header (uint32), the number of rows
+and columns (uint64 each), and the JSON header, padded so that the data
+starts at a multiple of 64 bytes.
+"""
+
+import json
+import os
+import struct
+
+import numpy as np
+
+MAGIC = b'TRAJSTR1'
+CHUNK_TAG = b'CHNK'
+PREFIX = struct.Struct('<4sIQQ')
+ALIGNMENT = 64
+
+# number of rows recorded for a chunk whose writer did not finish
+UNFINISHED = 2**64 - 1
+
+
+def to_jsonable(params):
+    """Convert a System, State, Params or mapping to a JSON-ready dict.
+
+    params: object with items(), an object with __dict__, or None
+
+    returns: dict
+    """
+    if params is None:
+        return {}
+    if hasattr(params, 'items'):
+        items = params.items()
+    else:
+        items = vars(params).items()
+    result = {}
+    for name, value in items:
+        if isinstance(value, np.generic):
+            value = value.item()
+        result[str(name)] = value
+    return result
+
+
+def padding(offset):
+    """Number of bytes needed to align `offset`."""
+    return -offset % ALIGNMENT
+
+
+class TrajectoryWriter:
+    """Append chunks of trajectories to a store.
+
+    filename: path of the store; created if it does not exist
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        existing = os.path.exists(filename) and os.path.getsize(filename) > 0
+        self.names = set()
+        if existing:
+            store = TrajectoryStore(filename)
+            self.names.update(store.names())
+            finish_unfinished(store)
+        self.file = open(filename, 'ab')
+        if not existing:
+            self.file.write(MAGIC)
+        self.chunk = None
+
+    def begin(self, name, num_steps, params=None, t_0=0, dtype=np.float64):
+        """Start a new chunk.
+
+        name: scenario name, unique within the store
+        num_steps: number of values in each trajectory
+        params: System or State describing the scenario
+        t_0: time of the first value
+        dtype: NumPy dtype of the values
+        """
+        if self.chunk is not None:
+            raise ValueError('Chunk %r is still open' % self.chunk['name'])
+        if name in self.names:
+            raise ValueError('Store already has a chunk named %r' % name)
+
+        dtype = np.dtype(dtype)
+        header = dict(name=name, t_0=t_0, dtype=dtype.str,
+                      params=to_jsonable(params))
+        text = json.dumps(header).encode('utf-8')
+
+        start = self.file.tell()
+        end_of_header = start + PREFIX.size + len(text)
+        text += b' ' * padding(end_of_header)
+        self.file.write(PREFIX.pack(CHUNK_TAG, len(text),
+                                    UNFINISHED, num_steps))
+        self.file.write(text)
+
+        self.chunk = dict(name=name, start=start, rows=0,
+                          num_steps=num_steps, dtype=dtype)
+        self.names.add(name)
+
+    def write(self, rows):
+        """Append one trajectory, or a 2-D array of them, to the chunk.
+
+        rows: sequence of values, TimeSeries, or 2-D array
+        """
+        chunk = self.chunk
+        if chunk is None:
+            raise ValueError('Call begin() before write()')
+        array = np.asarray(rows, dtype=chunk['dtype'])
+        if array.ndim == 1:
+            array = array[None, :]
+        if array.shape[1] != chunk['num_steps']:
+            raise ValueError('Expected %d values per trajectory, got %d' %
+                             (chunk['num_steps'], array.shape[1]))
+        self.file.write(np.ascontiguousarray(array).tobytes())
+        chunk['rows'] += len(array)
+
+    def end(self):
+        """Finish the current chunk by recording its number of rows."""
+        chunk = self.chunk
+        if chunk is None:
+            return
+        self.file.flush()
+        with open(self.filename, 'r+b') as f:
+            f.seek(chunk['start'] + 8)
+            f.write(struct.pack('<Q', chunk['rows']))
+        self.chunk = None
+
+    def append(self, name, array, params=None, t_0=0):
+        """Write a whole chunk at once.
+
+        name: scenario name
+        array: 2-D array with one row per trajectory
+        params: System or State describing the scenario
+        t_0: time of the first value
+        """
+        array = np.asarray(array)
+        self.begin(name, array.shape[1], params, t_0, array.dtype)
+        self.write(array)
+        self.end()
+
+    def close(self):
+        self.end()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def clip_slice(index, length, offset=0):
+    """Convert a slice of labels to a slice of positions in range.
+
+    index: slice of labels; its step, if any, has to be positive
+    length: number of positions
+    offset: label of position 0
+
+    returns: slice with start and stop in [0, length]
+    """
+    if index.step is not None and index.step < 1:
+        raise ValueError('Slice step should be positive, not %d' %
+                         index.step)
+    start = 0 if index.start is None else index.start - offset
+    stop = length if index.stop is None else index.stop - offset
+    return slice(min(max(start, 0), length), min(max(stop, 0), length),
+                 index.step)
+
+
+def finish_unfinished(store):
+    """Repair a store whose last writer did not call end().
+
+    Records the number of complete rows in the last chunk and drops any
+    partial row, so that new chunks can be appended after it.
+
+    store: TrajectoryStore
+    """
+    if not store.chunks:
+        return
+    chunk = list(store.chunks.values())[-1]
+    if not chunk['unfinished']:
+        return
+
+    end = chunk['offset'] + chunk['rows'] * chunk['cols'] * \
+        chunk['dtype'].itemsize
+    with open(store.filename, 'r+b') as f:
+        f.truncate(end)
+        f.seek(chunk['start'] + 8)
+        f.write(struct.pack('<Q', chunk['rows']))
+    chunk['unfinished'] = False
+
+
+class TrajectoryStore:
+    """Read a trajectory store through a memory map.
+
+    filename: path of the store
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.chunks = {}
+        self._scan()
+
+    def _scan(self):
+        """Read the chunk headers, skipping over the data."""
+        size = os.path.getsize(self.filename)
+        with open(self.filename, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError('%s is not a trajectory store' %
+                                 self.filename)
+            offset = len(MAGIC)
+            while offset + PREFIX.size <= size:
+                f.seek(offset)
+                tag, header_len, rows, cols = PREFIX.unpack(
+                    f.read(PREFIX.size))
+                if tag != CHUNK_TAG:
+                    raise ValueError('Corrupt chunk at offset %d' % offset)
+                header = json.loads(f.read(header_len))
+                dtype = np.dtype(header['dtype'])
+                data_offset = offset + PREFIX.size + header_len
+                row_bytes = cols * dtype.itemsize
+
+                unfinished = rows == UNFINISHED
+                if unfinished:
+                    # the writer did not finish; keep the complete rows
+                    rows = (size - data_offset) // row_bytes if row_bytes \
+                        else 0
+                header.update(start=offset, offset=data_offset, rows=rows,
+                              cols=cols, dtype=dtype, unfinished=unfinished)
+                self.chunks[header['name']] = header
+                offset = data_offset + rows * row_bytes
+
+    def names(self):
+        """List the scenarios in the store."""
+        return list(self.chunks)
+
+    def params(self, name):
+        """Get the parameters recorded for a scenario."""
+        return self.chunks[name]['params']
+
+    def shape(self, name):
+        """Get (number of trajectories, number of time steps)."""
+        chunk = self.chunks[name]
+        return chunk['rows'], chunk['cols']
+
+    def array(self, name):
+        """Get all trajectories of a scenario as a read-only memory map.
+
+        returns: 2-D array, one row per trajectory
+        """
+        chunk = self.chunks[name]
+        shape = chunk['rows'], chunk['cols']
+        if shape[0] == 0 or shape[1] == 0:
+            return np.empty(shape, dtype=chunk['dtype'])
+        return np.memmap(self.filename, dtype=chunk['dtype'], mode='r',
+                         offset=chunk['offset'], shape=shape)
+
+    def read(self, name, rows=slice(None), times=slice(None)):
+        """Read some trajectories and time steps of a scenario.
+
+        Only the selected part of the file is read from disk. Neither
+        rows nor times count from the end: slices are clipped to the
+        stored range, like list slices, and an index outside it raises
+        IndexError.
+
+        name: scenario name
+        rows: index or slice of trajectories
+        times: slice of times, in the units of t_0 (not positions)
+
+        returns: array
+        """
+        chunk = self.chunks[name]
+        if isinstance(rows, slice):
+            rows = clip_slice(rows, chunk['rows'])
+        elif not 0 <= rows < chunk['rows']:
+            raise IndexError('Row %d out of range for %r' % (rows, name))
+        times = clip_slice(times, chunk['cols'], chunk['t_0'])
+        return self.array(name)[rows, times]
+
+    def __contains__(self, name):
+        return name in self.chunks
+
+    def __iter__(self):
+        return iter(self.chunks)
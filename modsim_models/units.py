@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""Check units at the boundary, and keep them out of the loops.
+
+The notebooks set up Pint, but attaching units to the population or to
+bike counts would send every `pop + growth` or `state.olin -= 1` through
+Pint's wrapper arithmetic, which is orders of magnitude slower than
+plain floats. `unit_boundary` wraps a simulation function instead:
+
+- when a System or State enters, each field with a declared unit is
+  checked for compatible dimensions and converted to that unit once;
+
+- the simulation runs on plain numbers;
+
+- the units are attached to the result on the way out.
+
+    @unit_boundary(inputs=dict(p_0='billion_people', alpha='1/year'),
+                   output='billion_people')
+    def run_growth(system):
+        return run_simulation(system, growth_func2)
+
+Plain numbers without units are accepted as already being in the
+declared unit, unless `strict=True`.
+"""
+
+from functools import wraps
+
+from .incremental import with_changes
+
+# define the units the models use, in case the registry does not
+DEFINITIONS = ['person = [population] = people',
+               'billion_people = 1e9 * person',
+               'bike = [bike] = bikes']
+
+# marks a field that did not exist before the call
+MISSING = object()
+
+
+def is_quantity(value):
+    """Check whether a value has Pint units."""
+    return hasattr(value, 'magnitude') and hasattr(value, 'units')
+
+
+def get_registry(values=()):
+    """Get the unit registry of the first quantity in `values`.
+
+    Falls back to Pint's application registry, and defines the units
+    in DEFINITIONS if they are missing.
+
+    returns: UnitRegistry
+    """
+    for value in values:
+        if is_quantity(value):
+            registry = value._REGISTRY
+            break
+    else:
+        import pint
+        registry = pint.get_application_registry()
+
+    for definition in DEFINITIONS:
+        name = definition.split('=')[0].strip()
+        if name not in registry:
+            registry.define(definition)
+    return registry
+
+
+def field_items(obj):
+    """Get the (name, value) pairs of a System, State or Params."""
+    if hasattr(obj, 'items'):
+        return list(obj.items())
+    return list(vars(obj).items())
+
+
+def strip_units(obj, units, strict=False):
+    """Check the units of some fields and replace them with magnitudes.
+
+    obj: System, State or Params
+    units: map from field name to unit string
+    strict: if True, fields without units are an error
+
+    returns: copy of obj with plain numbers in the declared units
+    """
+    changes = {}
+    for name, value in field_items(obj):
+        unit = units.get(name)
+        if unit is None:
+            if is_quantity(value):
+                raise TypeError('Field %r has units %s but no declared '
+                                'unit' % (name, value.units))
+            continue
+        if is_quantity(value):
+            # raises DimensionalityError if the dimensions do not match
+            changes[name] = value.m_as(unit)
+        elif strict:
+            raise TypeError('Field %r should have units of %s' %
+                            (name, unit))
+
+    missing = set(units) - {name for name, value in field_items(obj)}
+    if missing:
+        raise AttributeError('Missing fields: %s' %
+                             ', '.join(sorted(missing)))
+    return with_changes(obj, **changes) if changes else obj
+
+
+def attach_units(results, unit, registry):
+    """Attach a unit to the result of a simulation.
+
+    A Series gets a pint-pandas dtype if pint-pandas is installed;
+    otherwise, its values stay plain and the unit is recorded in
+    `results.attrs['units']`; use `to_quantity` to convert. Other
+    results are multiplied by the unit.
+
+    returns: result with units
+    """
+    if hasattr(results, 'attrs') and hasattr(results, 'index'):
+        try:
+            import pint_pandas  # noqa: F401
+        except ImportError:
+            results.attrs['units'] = unit
+            return results
+        return results.astype('pint[%s]' % unit)
+    return results * registry(unit)
+
+
+def to_quantity(series, registry=None):
+    """Convert a Series returned by a unit_boundary function to a Quantity.
+
+    series: Series with `attrs['units']`
+    registry: UnitRegistry, default is Pint's application registry
+
+    returns: Quantity wrapping an array
+    """
+    registry = registry or get_registry()
+    return registry.Quantity(series.values, series.attrs['units'])
+
+
+def unit_boundary(inputs, output=None, strict=False, write_back=True):
+    """Decorate a simulation so units are handled only at the boundary.
+
+    The first argument of the decorated function has to be a System or
+    State. Its fields listed in `inputs` are checked and converted to
+    plain numbers before the call.
+
+    If the function modifies its System or State, as the bikeshare
+    `run_simulation` does, and `write_back` is True, every field it
+    changed is copied back to the original object; the fields in
+    `inputs` get their units back.
+
+    inputs: map from field name to unit string
+    output: unit of the result, or None to return it unchanged
+    strict: if True, fields without units are an error
+    write_back: whether to copy modified fields back to the argument
+
+    returns: decorator
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(obj, *args, **kwargs):
+            fields = dict(field_items(obj))
+            registry = get_registry(fields.values())
+            plain = strip_units(obj, inputs, strict)
+            if plain is obj and write_back:
+                # modifications should not leak through an alias
+                plain = with_changes(obj)
+
+            before = dict(field_items(plain))
+            results = func(plain, *args, **kwargs)
+
+            if write_back:
+                for name, value in field_items(plain):
+                    # identity, since == is elementwise for arrays
+                    if value is before.get(name, MISSING):
+                        continue
+                    if name in inputs and is_quantity(fields[name]):
+                        value = registry.Quantity(value, inputs[name])
+                    try:
+                        setattr(obj, name, value)
+                    except AttributeError:
+                        # immutable Params; the caller keeps the original
+                        break
+
+            if output is not None and results is not None:
+                results = attach_units(results, output, registry)
+            return results
+        return wrapper
+    return decorator
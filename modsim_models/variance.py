@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""Compare bikeshare scenarios with fewer replicas.
+
+To tell whether a change, such as `p1=0.3` versus `p1=0.35`, affects
+the number of unhappy customers, we estimate the mean difference
+between the two scenarios. With independent runs, the noise in each
+run adds up. Two variance reduction techniques cancel much of it:
+
+- common random numbers (CRN): replica i of both scenarios uses the
+  same uniform draws, so their differences reflect the change in
+  parameters rather than different luck;
+
+- antithetic draws: each replica is paired with a mirror run that uses
+  1 - u wherever the first used u, so an unlucky run tends to be
+  paired with a lucky one.
+
+`compare` runs both scenarios with any combination of the two and
+reports the paired-difference estimate, its standard error, and the
+variance reduction relative to independent runs with the same number
+of simulations.
+
+    base = dict(olin=10, wellesley=2, p1=0.3, p2=0.2)
+    compare(base, dict(base, p1=0.35), num_steps=60, replicas=200)
+"""
+
+import random
+from math import sqrt
+
+from .core import bikeshare_kernel
+
+METRICS = ['olin_empty', 'wellesley_empty', 'unhappy']
+METHODS = ['independent', 'crn', 'antithetic', 'crn+antithetic']
+
+
+def make_draws(rng, num_steps):
+    """Draw the uniform numbers used by one replica.
+
+    rng: random.Random
+    num_steps: number of time steps
+
+    returns: list with two numbers per step
+    """
+    return [rng.random() for i in range(2 * num_steps)]
+
+
+def run_draws(scenario, num_steps, draws):
+    """Run one replica of a scenario with the given uniform draws.
+
+    scenario: dict with olin, wellesley, p1 and p2
+    num_steps: number of time steps
+    draws: list of uniform numbers, two per step
+
+    returns: dict with olin_empty, wellesley_empty and unhappy
+    """
+    values, final = bikeshare_kernel(scenario.get('olin', 10),
+                                     scenario.get('wellesley', 2), 0, 0,
+                                     scenario['p1'], scenario['p2'],
+                                     num_steps, iter(draws).__next__)
+    olin_empty, wellesley_empty = final[2], final[3]
+    return dict(olin_empty=olin_empty,
+                wellesley_empty=wellesley_empty,
+                unhappy=olin_empty + wellesley_empty)
+
+
+def mean_var(xs):
+    """Compute the mean and sample variance of a sequence."""
+    n = len(xs)
+    mean = sum(xs) / n
+    var = sum((x - mean)**2 for x in xs) / (n - 1) if n > 1 else 0.0
+    return mean, var
+
+
+def compare(scenario_a, scenario_b, num_steps, replicas,
+            method='crn+antithetic', seed=None):
+    """Estimate the mean difference between two bikeshare scenarios.
+
+    With an antithetic method, `replicas` counts pairs, so each
+    scenario is simulated 2 * replicas times.
+
+    scenario_a, scenario_b: dicts with olin, wellesley, p1 and p2
+    num_steps: number of time steps per replica
+    replicas: number of replicas, or antithetic pairs
+    method: one of METHODS
+    seed: seed for the random number generator
+
+    returns: map from metric name to a dict with the mean difference
+             (b - a), its standard error, a 95% confidence interval,
+             the number of simulations per scenario and the variance
+             reduction factor relative to independent runs
+    """
+    if method not in METHODS:
+        raise ValueError('method should be one of %s, not %r' %
+                         (', '.join(METHODS), method))
+    crn = method.startswith('crn')
+    antithetic = method.endswith('antithetic')
+
+    rng = random.Random(seed)
+    per_unit = 2 if antithetic else 1
+    samples = {metric: dict(a=[], b=[], diff=[]) for metric in METRICS}
+
+    for i in range(replicas):
+        draws_a = make_draws(rng, num_steps)
+        draws_b = draws_a if crn else make_draws(rng, num_steps)
+        runs_a = [run_draws(scenario_a, num_steps, draws_a)]
+        runs_b = [run_draws(scenario_b, num_steps, draws_b)]
+        if antithetic:
+            runs_a.append(run_draws(scenario_a, num_steps,
+                                    [1 - u for u in draws_a]))
+            runs_b.append(run_draws(scenario_b, num_steps,
+                                    [1 - u for u in draws_b]))
+
+        for metric, sample in samples.items():
+            # the first run of each unit is a plain, independent sample
+            sample['a'].append(runs_a[0][metric])
+            sample['b'].append(runs_b[0][metric])
+            a = sum(run[metric] for run in runs_a) / per_unit
+            b = sum(run[metric] for run in runs_b) / per_unit
+            sample['diff'].append(b - a)
+
+    report = {}
+    for metric, sample in samples.items():
+        mean, var = mean_var(sample['diff'])
+        stderr = sqrt(var / replicas)
+
+        # variance of one unit's difference if its runs of a and b
+        # had all been independent
+        var_independent = (mean_var(sample['a'])[1] +
+                           mean_var(sample['b'])[1]) / per_unit
+        reduction = var_independent / var if var > 0 else float('inf')
+
+        report[metric] = dict(mean_difference=mean,
+                              stderr=stderr,
+                              ci95=(mean - 1.96 * stderr,
+                                    mean + 1.96 * stderr),
+                              simulations=per_unit * replicas,
+                              variance_reduction=reduction)
+    return report
+
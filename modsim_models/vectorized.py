@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""Loop-free bikeshare kernel.
+
+One bikeshare trajectory is a random walk in the number of bikes at
+Olin, with barriers at 0 (no bike for an Olin->Wellesley ride) and at
+the total number of bikes (no bike for a Wellesley->Olin ride). This
+module computes the whole walk with array operations instead of a
+Python loop over time steps.
+
+Each step of `step` is two moves: first -1 if there is an
+Olin->Wellesley ride, then +1 if there is a Wellesley->Olin ride. Each
+move is the function x -> min(max(x + d, 0), total). Functions of the
+form min(max(x + a, lo), hi) are closed under composition, so the
+position after every move is an inclusive prefix "sum" of these
+functions, which we compute with a parallel prefix scan: O(log n)
+rounds of array operations and linear total work. A move was blocked,
+and a customer unhappy, when it was nonzero but the position did not
+change.
+
+Given the same uniform draws, the results are identical to the
+reference `step`: draws[i, 0] decides the Olin->Wellesley ride of step
+i and draws[i, 1] decides the Wellesley->Olin ride.
+"""
+
+import numpy as np
+
+from .core import TimeSeries
+
+BLOCK_SIZE = 1 << 20
+
+
+def compose(first, second):
+    """Compose clamp functions elementwise: second after first.
+
+    Each function is a tuple of arrays (a, lo, hi) representing
+    x -> min(max(x + a, lo), hi), with lo <= hi.
+
+    returns: tuple of arrays (a, lo, hi)
+    """
+    a1, lo1, hi1 = first
+    a2, lo2, hi2 = second
+    a = a1 + a2
+    hi = np.minimum(np.maximum(hi1 + a2, lo2), hi2)
+    lo = np.minimum(np.maximum(lo1 + a2, lo2), hi)
+    return a, lo, hi
+
+
+def apply(funcs, x):
+    """Apply clamp functions (a, lo, hi) elementwise to x."""
+    a, lo, hi = funcs
+    return np.minimum(np.maximum(x + a, lo), hi)
+
+
+def scan_positions(x0, funcs):
+    """Apply a sequence of clamp functions, returning every position.
+
+    Works like a parallel prefix scan: compose adjacent pairs of
+    functions, find the positions after each pair recursively, then
+    fill in the positions after the first function of each pair. Each
+    level halves the length, so the total work is linear.
+
+    x0: starting position
+    funcs: tuple of arrays (a, lo, hi)
+
+    returns: array with the position after each function
+    """
+    a, lo, hi = funcs
+    n = len(a)
+    if n == 1:
+        return apply(funcs, x0)
+
+    if n % 2:
+        # pad with an identity function so the functions pair up
+        big = np.iinfo(np.int64).max // 4
+        a, lo, hi = (np.append(a, 0), np.append(lo, -big),
+                     np.append(hi, big))
+
+    first = a[0::2], lo[0::2], hi[0::2]
+    second = a[1::2], lo[1::2], hi[1::2]
+    after_pairs = scan_positions(x0, compose(first, second))
+
+    positions = np.empty(len(a), dtype=np.int64)
+    positions[1::2] = after_pairs
+    before = np.empty_like(after_pairs)
+    before[0] = x0
+    before[1:] = after_pairs[:-1]
+    positions[0::2] = apply(first, before)
+    return positions[:n]
+
+
+def clamped_walk(x0, moves, total):
+    """Compute a walk that is clipped to [0, total] after every move.
+
+    x0: starting position
+    moves: array of moves
+    total: upper barrier
+
+    returns: array of positions after each move
+    """
+    a = moves.astype(np.int64)
+    lo = np.zeros_like(a)
+    hi = np.full_like(a, total)
+    return scan_positions(x0, (a, lo, hi))
+
+
+def bikeshare_path(olin, wellesley, p1, p2, num_steps, draws=None,
+                   rng=None, block_size=BLOCK_SIZE):
+    """Simulate one bikeshare trajectory without a loop over steps.
+
+    olin, wellesley: initial number of bikes at each station
+    p1: probability of an Olin->Wellesley ride
+    p2: probability of a Wellesley->Olin ride
+    num_steps: number of time steps
+    draws: array of uniform numbers with shape (num_steps, 2); if None,
+           they are drawn from `rng`
+    rng: NumPy Generator, default is a new unseeded one
+    block_size: number of steps per block; long runs are processed in
+                blocks to bound memory use
+
+    returns: array of the number of bikes at Olin after each step
+             (starting with the initial value), olin_empty,
+             wellesley_empty
+    """
+    total = olin + wellesley
+    if draws is None:
+        rng = rng or np.random.default_rng()
+        draws = rng.random((num_steps, 2))
+    draws = np.asarray(draws)
+    if draws.shape != (num_steps, 2):
+        raise ValueError('draws should have shape (%d, 2), not %s' %
+                         (num_steps, draws.shape))
+
+    values = np.empty(num_steps + 1, dtype=np.int64)
+    values[0] = olin
+    olin_empty = wellesley_empty = 0
+
+    x0 = olin
+    for start in range(0, num_steps, block_size):
+        block = draws[start:start + block_size]
+        moves = np.empty(2 * len(block), dtype=np.int64)
+        moves[0::2] = -(block[:, 0] < p1).astype(np.int64)
+        moves[1::2] = block[:, 1] < p2
+
+        positions = clamped_walk(x0, moves, total)
+        before = np.empty_like(positions)
+        before[0] = x0
+        before[1:] = positions[:-1]
+
+        blocked = (moves != 0) & (positions == before)
+        olin_empty += int(np.count_nonzero(blocked[0::2]))
+        wellesley_empty += int(np.count_nonzero(blocked[1::2]))
+
+        values[start + 1:start + 1 + len(block)] = positions[1::2]
+        x0 = int(positions[-1])
+
+    return values, olin_empty, wellesley_empty
+
+
+def run_simulation(state, p1, p2, num_steps, draws=None, rng=None):
+    """Simulate the given number of time steps with the vectorized kernel.
+
+    Same interface as bikeshare.run_simulation: updates `state` and
+    returns the number of bikes at Olin.
+
+    state: State object
+    p1: probability of an Olin->Wellesley customer arrival
+    p2: probability of a Wellesley->Olin customer arrival
+    num_steps: number of time steps
+    draws: optional array of uniform numbers with shape (num_steps, 2)
+    rng: NumPy Generator used when draws is None
+
+    returns: TimeSeries
+    """
+    values, olin_empty, wellesley_empty = bikeshare_path(
+        state.olin, state.wellesley, p1, p2, num_steps, draws, rng)
+    total = state.olin + state.wellesley
+    state.olin = int(values[-1])
+    state.wellesley = total - state.olin
+    state.olin_empty += olin_empty
+    state.wellesley_empty += wellesley_empty
+    return TimeSeries(values)
@@ -0,0 +1,26 @@
+import pytest
+
+from modsim_models.ensemble import plot_bands
+
+pd = pytest.importorskip('pandas')
+matplotlib = pytest.importorskip('matplotlib')
+matplotlib.use('Agg')
+
+
+@pytest.mark.parametrize('low, high, expected', [
+    (0.07, 0.93, '7-93%'),
+    (0.05, 0.95, '5-95%'),
+    (0.025, 0.975, '2.5-97.5%'),
+])
+def test_plot_bands_label(low, high, expected):
+    import matplotlib.pyplot as plt
+
+    table = pd.DataFrame({low: [1.0, 2.0], 0.5: [2.0, 3.0],
+                          high: [3.0, 4.0]}, index=[1950, 1951])
+    plt.figure()
+    try:
+        plot_bands(table)
+        handles, labels = plt.gca().get_legend_handles_labels()
+    finally:
+        plt.close()
+    assert expected in labels
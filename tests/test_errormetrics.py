@@ -0,0 +1,74 @@
+import math
+
+import pytest
+
+from modsim_models.errormetrics import ErrorMetrics, RollingErrorMetrics
+from modsim_models.population import compute_errors
+
+pd = pytest.importorskip('pandas')
+np = pytest.importorskip('numpy')
+
+
+def make_estimates(seed=3):
+    rng = np.random.default_rng(seed)
+    years = range(1950, 2017)
+    census = pd.Series(2.5 + 0.07 * np.arange(len(years)), index=years)
+    un = census + rng.normal(0, 0.05, len(years))
+    un[2016] = np.nan
+    return un, census
+
+
+def check_summary(summary, un, census):
+    expected = compute_errors(un, census)
+    assert summary['count'] == expected['abs_error'].count()
+    for key in ['mean_abs_error', 'max_abs_error', 'mean_rel_error']:
+        assert summary[key] == pytest.approx(expected[key], rel=1e-12,
+                                             nan_ok=True)
+    assert summary['max_rel_error'] == pytest.approx(
+        expected['rel_error'].max(), rel=1e-12, nan_ok=True)
+
+
+def test_from_series_matches_compute_errors():
+    un, census = make_estimates()
+    check_summary(ErrorMetrics.from_series(un, census).summary(),
+                  un, census)
+
+
+def test_updates_match_compute_errors():
+    un, census = make_estimates()
+    metrics = ErrorMetrics.from_series(un, census)
+
+    # fill in the missing year, and replace the year with the largest error
+    un[2016] = 7.43
+    metrics.update(2016, un=7.43)
+    worst = (un - census).abs().idxmax()
+    un[worst] = census[worst]
+    metrics.update(worst, un=census[worst])
+    check_summary(metrics.summary(), un, census)
+
+    un[1990] = np.nan
+    metrics.update(1990, un=float('nan'))
+    check_summary(metrics.summary(), un, census)
+    assert math.isnan(metrics.abs_error(1990))
+
+
+@pytest.mark.parametrize('window', [1, 5, 20])
+def test_rolling_matches_compute_errors(window):
+    un, census = make_estimates()
+    metrics = RollingErrorMetrics(window)
+    for year in census.index:
+        metrics.update(year, un[year], census[year])
+        first = year - window + 1
+        check_summary(metrics.summary(), un.loc[first:year],
+                      census.loc[first:year])
+
+    un[2016] = 7.43
+    metrics.update(2016, un=7.43)
+    first = 2017 - window
+    check_summary(metrics.summary(), un.loc[first:], census.loc[first:])
+
+
+def test_empty_summary_is_nan():
+    summary = ErrorMetrics().summary()
+    assert summary['count'] == 0
+    assert math.isnan(summary['mean_abs_error'])
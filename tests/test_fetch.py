@@ -0,0 +1,78 @@
+import hashlib
+import os
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from modsim_models.fetch import FetchError, fetch
+
+CONTENTS = b'year,census\n1950,2.557\n' * 1000
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(tmp_path):
+    served = tmp_path / 'served'
+    served.mkdir()
+    (served / 'data.csv').write_bytes(CONTENTS)
+    handler = partial(QuietHandler, directory=str(served))
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    thread = threading.Thread(target=httpd.serve_forever, args=(0.05,),
+                              daemon=True)
+    thread.start()
+    try:
+        yield 'http://127.0.0.1:%d/' % httpd.server_address[1]
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+@pytest.fixture
+def local(tmp_path):
+    directory = tmp_path / 'local'
+    directory.mkdir()
+    return directory
+
+
+def test_download_then_not_modified(server, local):
+    url = server + 'data.csv'
+    [result] = fetch([url], str(local))
+    assert result.status == 'downloaded'
+    assert (local / 'data.csv').read_bytes() == CONTENTS
+    assert sorted(os.listdir(local)) == ['data.csv', 'data.csv.meta.json']
+
+    [result] = fetch([url], str(local))
+    assert result.status == 'not modified'
+
+
+def test_corrupted_file_is_fetched_again(server, local):
+    url = server + 'data.csv'
+    fetch([url], str(local))
+    (local / 'data.csv').write_bytes(b'truncated')
+
+    [result] = fetch([url], str(local))
+    assert result.status == 'downloaded'
+    assert (local / 'data.csv').read_bytes() == CONTENTS
+
+
+def test_checksum_mismatch(server, local):
+    url = server + 'data.csv'
+    with pytest.raises(FetchError, match='Checksum mismatch'):
+        fetch([url], str(local), checksums={url: '0' * 64})
+    assert os.listdir(local) == []
+
+    sha256 = hashlib.sha256(CONTENTS).hexdigest()
+    [result] = fetch([url], str(local), checksums={url: sha256})
+    assert result.status == 'downloaded'
+
+
+def test_missing_file(server, local):
+    with pytest.raises(FetchError, match='404'):
+        fetch([server + 'missing.csv'], str(local))
+    assert os.listdir(local) == []
@@ -0,0 +1,25 @@
+import pickle
+
+import pytest
+
+from modsim_models.params import Params
+
+
+def test_set_and_hash():
+    system = Params(t_0=1950, t_end=2016, alpha=0.025)
+    changed = system.set(alpha=0.03)
+    assert system.alpha == 0.025 and changed.alpha == 0.03
+    assert changed == Params(t_0=1950, t_end=2016, alpha=0.03)
+    assert hash(changed) == hash(Params(t_0=1950, t_end=2016, alpha=0.03))
+    assert pickle.loads(pickle.dumps(system)) == system
+    with pytest.raises(AttributeError):
+        system.alpha = 0.03
+
+
+@pytest.mark.parametrize('name', ['_hash', '_fields', 'set', 'get', 'bind',
+                                  'asdict', 'items', 'from_system'])
+def test_reserved_field_names(name):
+    with pytest.raises(ValueError, match=name):
+        Params(a=2, **{name: 1})
+    with pytest.raises(ValueError, match=name):
+        Params(a=2).set(**{name: 1})
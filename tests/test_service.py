@@ -0,0 +1,99 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from modsim_models.core import State
+from modsim_models.growth import growth_func2, run_simulation
+from modsim_models.service import (SimulationService, evaluate_growth,
+                                   request, serve)
+from modsim_models.vectorized import bikeshare_path
+
+GROWTH = dict(t_0=1950, t_end=1960, p_0=2.557, alpha=0.0173)
+
+
+def reference_growth(params):
+    system = State(**params)
+    return list(run_simulation(system, growth_func2))
+
+
+def test_evaluate_growth_matches_run_simulation():
+    batch = [GROWTH, dict(GROWTH, t_end=1955, alpha=0.02),
+             dict(GROWTH, t_0=1960, t_end=1970),
+             dict(GROWTH, t_end=1950)]
+    results = evaluate_growth('growth2', batch)
+    for params, result in zip(batch, results):
+        assert result == reference_growth(params)
+    assert results[-1] == [GROWTH['p_0']]
+
+
+def test_evaluate_growth_rejects_t_end_before_t_0():
+    with pytest.raises(ValueError):
+        evaluate_growth('growth2', [GROWTH, dict(GROWTH, t_end=1940)])
+
+
+def run_server(messages):
+    async def main():
+        async with SimulationService(window=0.01,
+                                     executor=executor) as service:
+            server = await serve(service)
+            port = server.sockets[0].getsockname()[1]
+            try:
+                return await request('127.0.0.1', port, messages)
+            finally:
+                server.close()
+                await server.wait_closed()
+
+    with ThreadPoolExecutor(2) as executor:
+        return asyncio.run(main())
+
+
+def test_requests_over_localhost():
+    bikeshare = dict(p1=0.3, p2=0.2, num_steps=60, seed=7)
+    messages = [
+        dict(id=1, model='growth2', params=GROWTH),
+        dict(id=2, model='bikeshare', params=bikeshare),
+        dict(id=3, model='growth2', params=dict(GROWTH, alpha=0.02)),
+        dict(id=4, model='growth2', params=dict(t_0=1950)),
+        dict(id=5, model='nonexistent', params={}),
+        dict(id=6, model='growth2', params=dict(GROWTH, t_end=1940)),
+    ]
+    responses = run_server(messages) + run_server([dict(id=7,
+                                                        metrics=True)])
+
+    ids = [response['id'] for response in responses]
+    assert ids == [1, 2, 3, 4, 5, 6, 7]
+    assert responses[0]['result'] == reference_growth(GROWTH)
+    assert responses[2]['result'] == reference_growth(
+        dict(GROWTH, alpha=0.02))
+
+    draws = np.random.default_rng(7).random((60, 2))
+    values, olin_empty, wellesley_empty = bikeshare_path(
+        10, 2, 0.3, 0.2, 60, draws=draws)
+    result = responses[1]['result']
+    assert result['values'] == list(values)
+    assert result['olin_empty'] == olin_empty
+    assert result['wellesley_empty'] == wellesley_empty
+
+    assert responses[3]['error'].startswith('KeyError')
+    assert responses[4]['error'].startswith('ValueError')
+    assert responses[5]['error'].startswith('ValueError')
+    assert responses[6]['metrics']['requests'] == 0
+
+
+def test_stop_finishes_pending_requests():
+    async def main():
+        service = SimulationService(window=0.05, executor=executor)
+        await service.start()
+        tasks = [asyncio.ensure_future(
+            service.submit('growth2', dict(GROWTH, alpha=alpha)))
+            for alpha in (0.01, 0.02, 0.03)]
+        await asyncio.sleep(0)
+        await service.stop()
+        return await asyncio.gather(*tasks)
+
+    with ThreadPoolExecutor(2) as executor:
+        results = asyncio.run(main())
+    assert results == [reference_growth(dict(GROWTH, alpha=alpha))
+                       for alpha in (0.01, 0.02, 0.03)]
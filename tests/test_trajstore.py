@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from modsim_models.trajstore import TrajectoryStore, TrajectoryWriter
+
+
+@pytest.fixture
+def store(tmp_path):
+    filename = str(tmp_path / 'runs.traj')
+    data = np.arange(30, dtype=float).reshape(3, 10)
+    with TrajectoryWriter(filename) as writer:
+        writer.append('pop', data, t_0=1950)
+    return TrajectoryStore(filename), data
+
+
+def test_read_times(store):
+    store, data = store
+    np.testing.assert_array_equal(
+        store.read('pop', times=slice(1952, 1955)), data[:, 2:5])
+    np.testing.assert_array_equal(
+        store.read('pop', rows=1, times=slice(1958, None)), data[1, 8:])
+
+
+def test_read_clips_times_outside_the_range(store):
+    store, data = store
+    assert store.read('pop', times=slice(1945, 1948)).shape == (3, 0)
+    np.testing.assert_array_equal(
+        store.read('pop', times=slice(1945, 1952)), data[:, :2])
+    np.testing.assert_array_equal(
+        store.read('pop', times=slice(1958, 1970)), data[:, 8:])
+    assert store.read('pop', times=slice(1970, 1980)).shape == (3, 0)
+
+
+def test_read_clips_rows(store):
+    store, data = store
+    np.testing.assert_array_equal(
+        store.read('pop', rows=slice(-2, 2)), data[:2])
+    np.testing.assert_array_equal(
+        store.read('pop', rows=slice(1, 10)), data[1:])
+    with pytest.raises(IndexError):
+        store.read('pop', rows=-1)
+    with pytest.raises(IndexError):
+        store.read('pop', rows=3)
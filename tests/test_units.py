@@ -0,0 +1,54 @@
+import random
+
+import pytest
+
+from modsim_models.bikeshare import make_state, run_simulation
+from modsim_models.units import get_registry, unit_boundary
+
+pint = pytest.importorskip('pint')
+
+
+def run_both(state, wrapped_state):
+    run = unit_boundary(inputs=dict(olin='bike', wellesley='bike'))(
+        run_simulation)
+    random.seed(1)
+    expected = run_simulation(state, 0.3, 0.2, 200)
+    random.seed(1)
+    results = run(wrapped_state, 0.3, 0.2, 200)
+    return expected, results
+
+
+def test_bikeshare_round_trip_plain():
+    state, wrapped = make_state(), make_state()
+    expected, results = run_both(state, wrapped)
+
+    assert list(results) == list(expected)
+    assert state.olin_empty > 0
+    assert vars(wrapped) == vars(state)
+
+
+def test_bikeshare_round_trip_quantities():
+    registry = get_registry()
+    state = make_state()
+    wrapped = make_state(olin=10 * registry.bike,
+                         wellesley=2 * registry.bike)
+    expected, results = run_both(state, wrapped)
+
+    assert list(results) == list(expected)
+    assert wrapped.olin == state.olin * registry.bike
+    assert wrapped.wellesley == state.wellesley * registry.bike
+    assert wrapped.olin_empty == state.olin_empty
+    assert wrapped.wellesley_empty == state.wellesley_empty
+
+
+def test_array_fields_are_written_back():
+    np = pytest.importorskip('numpy')
+    state = make_state()
+    state.history = np.zeros(3)
+
+    @unit_boundary(inputs=dict(olin='bike'))
+    def record(state):
+        state.history = state.history + 1
+
+    record(state)
+    assert list(state.history) == [1, 1, 1]
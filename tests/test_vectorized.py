@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from modsim_models.core import bikeshare_kernel
+from modsim_models.vectorized import bikeshare_path
+
+
+def kernel_path(olin, wellesley, p1, p2, draws):
+    rand = iter(draws.ravel().tolist()).__next__
+    values, final = bikeshare_kernel(olin, wellesley, 0, 0, p1, p2,
+                                     len(draws), rand)
+    return values, final[2], final[3]
+
+
+def random_cases(n, seed=17):
+    rng = np.random.default_rng(seed)
+    for i in range(n):
+        olin, wellesley = rng.integers(0, 15, size=2)
+        p1, p2 = rng.random(2)
+        num_steps = int(rng.choice([0, 1, 2, 7, 60, 500]))
+        block_size = int(rng.choice([1, 3, 64, 1 << 20]))
+        draws = rng.random((num_steps, 2))
+        yield int(olin), int(wellesley), p1, p2, draws, block_size
+
+
+def test_matches_kernel_on_random_cases():
+    for olin, wellesley, p1, p2, draws, block_size in random_cases(500):
+        values, olin_empty, wellesley_empty = bikeshare_path(
+            olin, wellesley, p1, p2, len(draws), draws=draws,
+            block_size=block_size)
+        expected = kernel_path(olin, wellesley, p1, p2, draws)
+        assert values.tolist() == expected[0]
+        assert (olin_empty, wellesley_empty) == expected[1:]
+
+
+@pytest.mark.parametrize('block_size', [1, 5, 1 << 20])
+def test_zero_steps(block_size):
+    values, olin_empty, wellesley_empty = bikeshare_path(
+        10, 2, 0.3, 0.2, 0, draws=np.empty((0, 2)), block_size=block_size)
+    assert values.tolist() == [10]
+    assert olin_empty == wellesley_empty == 0
+
+
+def test_draws_have_to_match_num_steps():
+    with pytest.raises(ValueError):
+        bikeshare_path(10, 2, 0.3, 0.2, 5, draws=np.zeros((4, 2)))